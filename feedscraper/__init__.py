@@ -1,5 +1,36 @@
-from feedscraper.feed import Feed, HomeFeed
-from feedscraper.post import Post
-from feedscraper.extractors import Field, Reaction
+"""
+The browser-dependent parts of the package (Feed, HomeFeed, Post, AdTracker, Enricher, Watchdog and
+ReactionTracker) are loaded lazily on first access,
+so importing feedscraper for Field, Reaction or offline processing does not load selenium.
+"""
+import importlib
+
+from feedscraper.fields import Field, Reaction, Tier
 
 __Version__ = '1.0.0'
+
+_LAZY_ATTRIBUTES = {
+    'Feed': 'feedscraper.feed',
+    'HomeFeed': 'feedscraper.feed',
+    'Post': 'feedscraper.post',
+    'AdTracker': 'feedscraper.ads',
+    'Enricher': 'feedscraper.enrichment',
+    'Watchdog': 'feedscraper.watchdog',
+    'ReactionTracker': 'feedscraper.tracking',
+    'Sampler': 'feedscraper.sampling',
+    'ParsePool': 'feedscraper.parsing',
+}
+
+__all__ = ['Field', 'Reaction', 'Tier'] + list(_LAZY_ATTRIBUTES)
+
+
+def __getattr__(name):
+    if name in _LAZY_ATTRIBUTES:
+        value = getattr(importlib.import_module(_LAZY_ATTRIBUTES[name]), name)
+        globals()[name] = value  # Cache, so later accesses don't go through __getattr__
+        return value
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+
+
+def __dir__():
+    return __all__ + ['__Version__']
@@ -0,0 +1,148 @@
+"""
+Tracking of the ads displayed in the home page sidebar.
+
+Rather than re-querying the sidebar in a polling loop, the AdTracker installs a MutationObserver in the page which
+buffers every change to the displayed ads as it happens. Draining the buffer is a single cheap script call, so it can
+be done between posts while browsing without taking up the driver.
+"""
+from datetime import datetime
+from typing import Dict, List
+
+from feedscraper import xpaths
+
+_INSTALL_SCRIPT = '''
+var sidebarXPath = arguments[0], adXPath = arguments[1];
+if (window.__feedscraperAds) { return true; }
+var sidebar = document.evaluate(sidebarXPath, document, null, XPathResult.FIRST_ORDERED_NODE_TYPE, null)
+    .singleNodeValue;
+if (!sidebar) { return false; }
+
+var state = {buffer: [], shown: {}};
+var snapshot = function () {
+    var result = document.evaluate(adXPath, document, null, XPathResult.ORDERED_NODE_SNAPSHOT_TYPE, null);
+    var shown = {};
+    for (var i = 0; i < result.snapshotLength; i++) {
+        var text = result.snapshotItem(i).innerText;
+        shown[text] = true;
+        if (!state.shown[text]) { state.buffer.push({text: text, time: Date.now()}); }
+    }
+    state.shown = shown;
+};
+state.observer = new MutationObserver(snapshot);
+state.observer.observe(sidebar, {childList: true, subtree: true, characterData: true});
+window.__feedscraperAds = state;
+snapshot();
+return true;
+'''
+"""Installs the sidebar observer, unless already installed. Returns false if the sidebar is not in the page."""
+
+_DRAIN_SCRIPT = '''
+var state = window.__feedscraperAds;
+if (!state) { return null; }
+var buffer = state.buffer;
+state.buffer = [];
+return {appeared: buffer, shown: Object.keys(state.shown), time: Date.now()};
+'''
+"""
+Empties the buffer of ads appearing since the last drain, and returns it with the ads currently shown. Returns null if
+the observer was not installed.
+"""
+
+_UNINSTALL_SCRIPT = '''
+if (window.__feedscraperAds) {
+    window.__feedscraperAds.observer.disconnect();
+    delete window.__feedscraperAds;
+}
+'''
+
+
+class Impression:
+    """
+    A sidebar ad as seen over the course of a session: when it was first and last displayed, and how many separate
+    times it appeared in the sidebar.
+    """
+
+    def __init__(self, ad, seen: datetime):
+        self.ad = ad
+        self.first_seen = seen
+        self.last_seen = seen
+        self.count = 1
+
+    def __repr__(self):
+        return f'Impression(ad={self.ad!r}, first_seen={self.first_seen}, last_seen={self.last_seen}, ' \
+               f'count={self.count})'
+
+
+class AdTracker:
+    """
+    Keeps a log of the ads displayed in a feed's sidebar, based on changes buffered in the page itself.
+    """
+
+    def __init__(self, feed: 'Feed'):
+        """
+        Installs the sidebar observer in the feed's page.
+
+        :param feed: the feed whose sidebar should be tracked.
+        """
+        self.feed = feed
+        self.impressions: Dict[tuple, Impression] = {}
+        self.install()
+
+    def install(self) -> bool:
+        """
+        Install the sidebar observer in the current page. This is done automatically on creation, and again when
+        draining after the page was reloaded.
+
+        :return: whether the sidebar was found and is now observed.
+        """
+        return self.feed.driver.execute_script(_INSTALL_SCRIPT, xpaths.SIDEBAR, xpaths.SIDEBAR_AD_TEXT)
+
+    def uninstall(self):
+        """Disconnect the sidebar observer. Changes made after this call will not be tracked."""
+        self.feed.driver.execute_script(_UNINSTALL_SCRIPT)
+
+    def drain(self) -> List[Impression]:
+        """
+        Collect the ads that appeared in the sidebar since the last call into the impression log, and extend the
+        impressions of the ads still displayed up to now.
+
+        :return: the impressions of the ads that appeared since the last call, in order of appearance, followed by
+        those of the other ads currently displayed.
+        """
+        changes = self.feed.driver.execute_script(_DRAIN_SCRIPT)
+        if changes is None:  # Page was reloaded, so the observer is gone
+            self.install()
+            changes = self.feed.driver.execute_script(_DRAIN_SCRIPT) or {'appeared': [], 'shown': [], 'time': 0}
+
+        updated = []
+        for change in changes['appeared']:
+            ad = self._ad(change['text'])
+            seen = datetime.fromtimestamp(change['time'] / 1000)
+
+            impression = self.impressions.get(ad)
+            if impression is None:
+                impression = self.impressions[ad] = Impression(ad, seen)
+            else:
+                impression.last_seen = seen
+                impression.count += 1
+
+            if impression not in updated:
+                updated.append(impression)
+
+        # Ads displayed continuously since they appeared were last seen now
+        now = datetime.fromtimestamp(changes['time'] / 1000)
+        for text in changes['shown']:
+            impression = self.impressions.get(self._ad(text))
+            if impression is not None:
+                impression.last_seen = max(impression.last_seen, now)
+                if impression not in updated:
+                    updated.append(impression)
+        return updated
+
+    def _ad(self, text: str) -> 'Feed.SidebarAd':
+        lines = text.splitlines()
+        return self.feed.SidebarAd(*(lines + [None, None])[:2])  # top line is name, bottom is link
+
+    def __iter__(self):
+        """Iterate over all impressions logged so far, by order of first appearance"""
+        return iter(self.impressions.values())
@@ -0,0 +1,68 @@
+"""
+Checkpoints allow long browsing sessions to be resumed after being interrupted, e.g by a crash or the browser dying,
+without re-extracting the posts that were already processed.
+"""
+import json
+import os
+from typing import Set
+
+
+class Checkpoint:
+    """
+    The state of a browse session, saved to a JSON file: the index of the next feed unit to process, the amount of
+    posts generated, the keys of the posts already generated (see extractors.post_key) and the last scroll position.
+    """
+
+    def __init__(self, path: str, *, index: int = 1, post_count: int = 0, seen: Set[str] = None,
+                 scroll_position: int = 0):
+        """
+        :param path: the file the checkpoint is saved to. If None, the checkpoint is only kept in memory.
+        :param index: the index of the next feed unit to process
+        :param post_count: the amount of posts generated so far
+        :param seen: keys of the posts already generated
+        :param scroll_position: the last vertical scroll position of the feed
+        """
+        self.path = path
+        self.index = index
+        self.post_count = post_count
+        self.seen = set() if seen is None else seen
+        self.scroll_position = scroll_position
+
+    @staticmethod
+    def load(path: str) -> 'Checkpoint':
+        """
+        Load a checkpoint from a file.
+
+        :param path: path of the checkpoint file
+        :return: the saved checkpoint, or a new one to be saved at the path if the file does not exist.
+        """
+        if not os.path.exists(path):
+            return Checkpoint(path)
+
+        with open(path) as f:
+            saved = json.load(f)
+        return Checkpoint(path, index=saved['index'], post_count=saved['post_count'], seen=set(saved['seen']),
+                          scroll_position=saved['scroll_position'])
+
+    def update(self, index: int, post_count: int, scroll_position: int):
+        """Set the position of the session in the feed"""
+        self.index = index
+        self.post_count = post_count
+        self.scroll_position = scroll_position
+
+    def save(self):
+        """
+        Write the checkpoint to its file. The file is replaced atomically, so a crash while saving leaves the previous
+        checkpoint intact.
+        """
+        if self.path is None:
+            return
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump({
+                'index': self.index,
+                'post_count': self.post_count,
+                'seen': sorted(self.seen),
+                'scroll_position': self.scroll_position
+            }, f)
+        os.replace(tmp_path, self.path)
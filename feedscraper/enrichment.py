@@ -0,0 +1,167 @@
+"""
+Enrichment of browsed posts with fields that are expensive to extract in the feed, such as those that need hovering
+(reactions, timestamp) or expansion (full text).
+
+Posts are opened by their permalinks in background tabs of the same logged-in browser. The pages load concurrently
+while the main tab keeps browsing the feed, and the enriched posts are generated back in feed order. Note that a
+webdriver controls one tab at a time, so it is the page loads that overlap with browsing; the extraction in each tab,
+once loaded, is short and done in between posts.
+"""
+import logging
+from collections import deque
+from datetime import datetime
+from time import sleep
+from typing import Iterable, Iterator, List
+
+from selenium.common.exceptions import NoSuchElementException, WebDriverException
+from selenium.webdriver.common.by import By
+
+from feedscraper import extractors, xpaths, log
+from feedscraper.fields import Field
+
+logger = log.get_logger(__name__)
+
+ENRICHABLE_FIELDS = [Field.TIMESTAMP, Field.TEXT, Field.REACTIONS]
+"""Fields that can be extracted from a post's permalink page"""
+
+_TAB_STATE_SCRIPT = '''
+if (window.__feedscraperDone || document.readyState !== 'complete') { return false; }
+return document.evaluate(arguments[0], document, null, XPathResult.FIRST_ORDERED_NODE_TYPE, null)
+    .singleNodeValue !== null;
+'''
+"""
+Checks whether a tab finished loading a post. The marker set on finished pages is cleared by navigation, so a tab
+still displaying its previous post is not mistaken for a loaded one.
+"""
+
+
+class Enricher:
+    """
+    Extracts fields of posts from their permalink pages in background tabs.
+    """
+    LOAD_TIMEOUT = 15
+    """Time (in seconds) to wait for a permalink page to load before giving up on enriching its post"""
+    POLL_INTERVAL = 0.1
+    """Time (in seconds) to wait between checks of the tabs, when nothing else can be done"""
+
+    def __init__(self, feed: 'Feed', fields=None, *, tabs: int = 3, backlog: int = None):
+        """
+        Opens the background tabs.
+
+        :param feed: the feed whose browser should be used
+        :param fields: the fields to extract from the permalink pages, out of ENRICHABLE_FIELDS (all of them by
+        default). Contains Field objects or strings.
+        :param tabs: the amount of background tabs to load posts in
+        :param backlog: the maximal amount of posts waiting for enrichment before browsing is paused. By default, four
+        times the amount of tabs.
+        """
+        self.feed = feed
+        self.fields = ENRICHABLE_FIELDS if fields is None else [Field(field) for field in fields]
+        self.backlog = 4 * tabs if backlog is None else backlog
+
+        driver = feed.driver
+        self.main_handle = driver.current_window_handle
+        self.names = {}  # Tab handle -> window name, used to load pages in it without switching to it
+        for i in range(tabs):
+            handles = set(driver.window_handles)
+            name = f'feedscraper_enrichment_{i}'
+            driver.execute_script('window.open("about:blank", arguments[0]);', name)
+            self.names[(set(driver.window_handles) - handles).pop()] = name
+        driver.switch_to.window(self.main_handle)
+
+        self.jobs = {handle: None for handle in self.names}  # Tab handle -> (post, load start time) or None if idle
+        self.queue = deque()  # Posts waiting for a tab
+        self.done = set()  # IDs of enriched (or failed) posts, which can be generated
+
+    def close(self):
+        """Close the background tabs"""
+        driver = self.feed.driver
+        for handle in self.names:
+            driver.switch_to.window(handle)
+            driver.close()
+        driver.switch_to.window(self.main_handle)
+        self.names = {}
+        self.jobs = {}
+
+    def enrich(self, posts: Iterable['Post']) -> Iterator['Post']:
+        """
+        Enrich posts as they are generated, e.g. by HomeFeed.browse (which should be asked for the URL field, and can
+        skip the fields enriched here).
+
+        :param posts: an iterable of posts, in feed order
+        :return: a generator of the same posts, with the enriched fields set, in the same order. Posts without a URL
+        are generated unchanged.
+        """
+        pending = deque()  # Posts in feed order, waiting for enrichment of themselves or preceding posts
+        for post in posts:
+            pending.append(post)
+            if post.url is None:
+                self.done.add(id(post))
+            else:
+                self.queue.append(post)
+
+            self._step()
+            yield from self._ready(pending)
+            while len(pending) >= self.backlog:  # Too many posts waiting, pause browsing
+                sleep(Enricher.POLL_INTERVAL)
+                self._step()
+                yield from self._ready(pending)
+
+        while pending:
+            sleep(Enricher.POLL_INTERVAL)
+            self._step()
+            yield from self._ready(pending)
+
+    def _ready(self, pending: deque) -> List['Post']:
+        """Remove and return the posts at the front of the pending queue that are done"""
+        ready = []
+        while pending and id(pending[0]) in self.done:
+            post = pending.popleft()
+            self.done.discard(id(post))
+            ready.append(post)
+        return ready
+
+    def _step(self):
+        """Extract posts from the tabs that finished loading, and start loading queued posts in idle tabs."""
+        driver = self.feed.driver
+        switched = False
+        for handle, job in self.jobs.items():
+            if job is None:
+                continue
+            post, start = job
+            driver.switch_to.window(handle)
+            switched = True
+            if driver.execute_script(_TAB_STATE_SCRIPT, xpaths.PERMALINK_POST):
+                self._extract(post)
+            elif (datetime.now() - start).total_seconds() > Enricher.LOAD_TIMEOUT:
+                logger.warning('Timed out enriching %s', post.url)
+            else:
+                continue
+            driver.execute_script('window.__feedscraperDone = true;')
+            self.jobs[handle] = None
+            self.done.add(id(post))
+
+        if switched:
+            driver.switch_to.window(self.main_handle)
+
+        # Pages are loaded through named windows from the main tab, so no switching is needed
+        for handle, job in self.jobs.items():
+            if job is None and self.queue:
+                post = self.queue.popleft()
+                driver.execute_script('window.open(arguments[0], arguments[1]);', post.url, self.names[handle])
+                self.jobs[handle] = (post, datetime.now())
+
+    def _extract(self, post: 'Post'):
+        """Extract the enriched fields of a post from the current tab, and set them in the post"""
+        driver = self.feed.driver
+        try:
+            post_element = driver.find_element(By.XPATH, xpaths.PERMALINK_POST)
+            if Field.TIMESTAMP in self.fields:
+                metadata = extractors.posting_metadata(post_element, driver=driver, fields=[Field.TIMESTAMP])
+                post.metadata = post.metadata._replace(timestamp=metadata.timestamp)
+            if Field.TEXT in self.fields:
+                post.text = extractors.text(post_element)
+            if Field.REACTIONS in self.fields:
+                post.reactions = extractors.reactions(post_element, driver)
+        except (NoSuchElementException, WebDriverException):
+            logger.warning('Failed to enrich %s', post.url, exc_info=logger.isEnabledFor(logging.DEBUG))
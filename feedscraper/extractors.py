@@ -3,13 +3,12 @@ These modules contain extraction functions that take in HTML elements (usually t
 some of its attributes such as timestamp, text or reactions.
 """
 
+import hashlib
+import logging
 import re
-import traceback
-from collections import namedtuple
 from datetime import datetime
-from enum import Enum
 from time import sleep
-from typing import Optional
+from typing import List, Optional
 
 from selenium.common.exceptions import NoSuchElementException, ElementNotInteractableException, \
     StaleElementReferenceException
@@ -18,38 +17,10 @@ from selenium.webdriver.chrome.webdriver import WebDriver
 from selenium.webdriver.common.by import By
 from selenium.webdriver.remote.webelement import WebElement
 
-from feedscraper import xpaths, utils
+from feedscraper import xpaths, utils, log
+from feedscraper.fields import Field, Reaction, Metadata, Reactions, Comment, Census, reactions_from_labels
 
-
-class Field(Enum):
-    USER = 'user'
-    PAGE = 'page'
-    TIMESTAMP = 'timestamp'
-    TEXT = 'text'
-    REACTIONS = 'reactions'
-    SPONSORED = 'sponsored'
-    RECOMMENDED = 'recommended'
-    LIKED = 'liked'
-    URL = 'url'
-
-
-class Reaction(Enum):
-    """
-    An enum containing currently available facebook reactions
-    """
-    ANGRY = "angry"
-    CARE = "care"
-    HAHA = "haha"
-    LIKE = "like"
-    LOVE = "love"
-    SAD = "sad"
-    WOW = "wow"
-
-
-Metadata = namedtuple('Metadata', ['user', 'page', 'timestamp'])
-"""A namedtuple class that contains user, page and timestamp of a post"""
-Reactions = namedtuple('Reactions', sorted([reaction.name.lower() for reaction in Reaction]))
-"""A named tuple class that contain attributes for each of the reactions specified in Reaction"""
+logger = log.get_logger(__name__)
 
 
 def feed_el(driver: WebDriver) -> WebElement:
@@ -79,6 +50,20 @@ def post_el(feed: WebElement, index: int) -> WebElement:
         return feed.find_element(By.XPATH, f'{xpaths.NTH_POST}[{index - 1}]')
 
 
+def loaded_unit_count(driver: WebDriver) -> int:
+    """
+    Count the feed units loaded in the page, in a single script call without any waits.
+
+    :param driver: the webdriver browsing facebook
+    :return: the amount of loaded feed units
+    """
+    return int(driver.execute_script(
+        'return document.evaluate("count(" + arguments[0] + ")", document, null, XPathResult.NUMBER_TYPE, null)'
+        '.numberValue;',
+        xpaths.FEED_UNITS
+    ))
+
+
 def is_arrow_ui(post: WebElement) -> bool:
     """
     Checks if a post's metadata is using "user > group" UI. See xpaths.ArrowUI for a more thorough explanation.
@@ -112,7 +97,8 @@ def timestamp_from_el(time_el: WebElement, driver: WebDriver) -> Optional[dateti
         popup_text = popup_el.get_attribute("textContent")
         return datetime.strptime(popup_text, '%A, %B %d, %Y at %I:%M %p')
     except IndexError:
-        utils.warning(utils.print_element(time_el))
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug('No timestamp tooltip for element:\n%s', utils.print_element(time_el))
         raise NoSuchElementException('Unable to find timestamp')
     except ElementNotInteractableException:
         return None
@@ -200,6 +186,107 @@ def url(post: WebElement) -> str:
     return re.sub('&.*$', '', permalink.get_attribute('href'))
 
 
+_POST_KEY_SCRIPT = '''
+var post = arguments[0], contentXPath = arguments[1], headingXPath = arguments[2];
+var links = post.querySelectorAll('a[href]');
+for (var i = 0; i < links.length; i++) {
+    if (/\\/(posts|videos|photos)\\/|permalink|story_fbid/.test(links[i].href)) {
+        return {permalink: links[i].href.replace(/&.*$/, '')};
+    }
+}
+var text = function (xpath) {
+    var node = document.evaluate(xpath, post, null, XPathResult.FIRST_ORDERED_NODE_TYPE, null).singleNodeValue;
+    return node === null ? null : node.innerText;
+};
+return {permalink: null, content: text(contentXPath), heading: text(headingXPath), text: post.innerText};
+'''
+"""
+Returns the permalink of a post if one is found, and otherwise its text content, its heading (user and page names)
+and its full text.
+"""
+
+_POST_KEY_CONTENT_LENGTH = 80
+"""Length of the text content prefix used in post keys, which is the same whether the text was expanded or not"""
+
+
+def post_key(post: WebElement, driver: WebDriver) -> str:
+    """
+    Get a key identifying a post across sessions. This is the post's permalink where one is found, and otherwise
+    a digest of its heading and the start of its text content, which do not change over time (unlike its relative
+    posting time or reaction counts). The key is read with a single script call, so it is much cheaper than the URL
+    field.
+
+    :param post: post's WebElement
+    :param driver: the webdriver browsing facebook
+    :return: a string key for the post
+    """
+    found = driver.execute_script(_POST_KEY_SCRIPT, post, xpaths.CONTENT_TEXT, f'{xpaths.METADATA}//h4')
+    if found['permalink'] is not None:
+        return found['permalink']
+    if found['content'] is None and found['heading'] is None:  # Nothing stable to go by
+        stable = found['text']
+    else:
+        stable = f'{found["heading"]}\n{(found["content"] or "")[:_POST_KEY_CONTENT_LENGTH]}'
+    return 'text:' + hashlib.sha1(stable.encode()).hexdigest()
+
+
+_CENSUS_SCRIPT = '''
+var post = arguments[0], x = arguments[1];
+var first = function (xpath, context) {
+    return document.evaluate(xpath, context, null, XPathResult.FIRST_ORDERED_NODE_TYPE, null).singleNodeValue;
+};
+var text = function (node) { return node === null ? null : node.innerText; };
+
+var user = null, page = null;
+var metadata = first(x.metadata, post);
+if (metadata !== null) {
+    var top = first(x.arrowTop, metadata);
+    if (top !== null && first(x.arrow, top) !== null) {
+        user = text(first(x.arrowUser, top));
+        page = text(first(x.arrowPage, top));
+    } else {
+        var lower = first(x.lowerMetadata, metadata);
+        if (lower !== null && lower.children.length === 5) {  // posted on group
+            user = text(first(x.groupUser, lower));
+            page = text(first(x.heading, metadata));
+        } else {
+            user = text(first(x.heading, metadata));
+        }
+    }
+}
+return {
+    user: user,
+    page: page,
+    sponsored: first(x.sponsored, post) !== null,
+    recommended: first(x.recommended, post) !== null
+};
+'''
+"""Extracts the census fields of a post, following the same XPaths as posting_metadata, is_sponsored etc."""
+
+
+def census(post: WebElement, driver: WebDriver) -> Census:
+    """
+    Get the fields of a post that can be extracted cheaply: posting user and page, and whether it is sponsored or
+    recommended. These are extracted in a single script call, without any waits for missing elements.
+
+    :param post: post's WebElement
+    :param driver: the webdriver browsing facebook
+    :return: a Census object of the post
+    """
+    return Census(**driver.execute_script(_CENSUS_SCRIPT, post, {
+        'metadata': xpaths.METADATA,
+        'lowerMetadata': xpaths.LOWER_METADATA,
+        'arrowTop': xpaths.ArrowUI.TOP_BY_METADATA,
+        'arrow': xpaths.ArrowUI.ARROW_BY_TOP,
+        'arrowUser': xpaths.ArrowUI.USER_BY_TOP,
+        'arrowPage': xpaths.ArrowUI.PAGE_BY_TOP,
+        'heading': xpaths.NonArrowUI.PAGE_BY_METADATA,
+        'groupUser': xpaths.NonArrowUI.USER_BY_LOWER_METADATA,
+        'sponsored': xpaths.SPONSORED,
+        'recommended': xpaths.RECOMMENDED,
+    }))
+
+
 def is_sponsored(post: WebElement) -> bool:
     try:
         post.find_element(By.XPATH, xpaths.SPONSORED)
@@ -236,18 +323,92 @@ def show_original_el(post: WebElement) -> WebElement:
     return post.find_element(By.XPATH, xpaths.SHOW_ORIGINAL_BTN)
 
 
+EXPANDED_ATTRIBUTE = 'data-feedscraper-expanded'
+"""Attribute marking posts whose text was fully expanded by expand_loaded_posts"""
+_EXPAND_TRIED_ATTRIBUTE = 'data-feedscraper-expand-tried'
+"""Attribute marking posts expand_loaded_posts already tried to expand, so they are not waited on again"""
+
+_EXPAND_TEXT_SCRIPT = '''
+var unitsXPath = arguments[0], seeMoreXPath = arguments[1], showOriginalXPath = arguments[2],
+    marker = arguments[3], triedMarker = arguments[4], deadline = Date.now() + arguments[5];
+var done = arguments[arguments.length - 1];
+
+var query = function (xpath, context) {
+    var result = document.evaluate(xpath, context, null, XPathResult.ORDERED_NODE_SNAPSHOT_TYPE, null);
+    var nodes = [];
+    for (var i = 0; i < result.snapshotLength; i++) { nodes.push(result.snapshotItem(i)); }
+    return nodes;
+};
+var buttons = function (unit) { return query(seeMoreXPath, unit).concat(query(showOriginalXPath, unit)); };
+
+// Units are only tried once: those that did not settle in time are left to text()
+var pending = query(unitsXPath, document).filter(function (unit) {
+    return !unit.hasAttribute(marker) && !unit.hasAttribute(triedMarker);
+});
+pending.forEach(function (unit) {
+    buttons(unit).forEach(function (button) { button.click(); });
+    unit.setAttribute(triedMarker, 'true');
+    unit.__feedscraperLength = -1;
+});
+
+// A post is expanded once it has no expansion buttons left and its text stopped changing between checks
+var expanded = 0;
+var settle = function () {
+    pending = pending.filter(function (unit) {
+        var length = unit.innerText.length;
+        if (buttons(unit).length === 0 && length === unit.__feedscraperLength) {
+            unit.setAttribute(marker, 'true');
+            expanded++;
+            return false;
+        }
+        unit.__feedscraperLength = length;
+        return true;
+    });
+    if (pending.length === 0 || Date.now() > deadline) { done(expanded); }
+    else { setTimeout(settle, 100); }
+};
+settle();
+'''
+"""
+Clicks all "See more" and "See original" buttons in the loaded posts that were not tried yet, waits for their text
+to settle, and marks them as expanded. Returns the amount of posts marked.
+"""
+
+
+def expand_loaded_posts(driver: WebDriver, *, timeout: float = 3) -> int:
+    """
+    Expand the text of all the posts loaded in the feed at once, in a single script. Posts that were expanded are
+    marked, so text() reads them directly, without looking for buttons to click.
+
+    :param driver: the webdriver browsing facebook
+    :param timeout: maximal time (in seconds) to wait for the text of the posts to settle. Posts that did not settle
+    in time are not marked, and are expanded by text() as usual. Each post is only tried once, so such posts do not
+    hold up later calls.
+    :return: the amount of newly expanded posts
+    """
+    driver.set_script_timeout(timeout + 5)
+    return driver.execute_async_script(
+        _EXPAND_TEXT_SCRIPT,
+        xpaths.FEED_UNITS, xpaths.SEE_MORE_BTN, xpaths.SHOW_ORIGINAL_BTN, EXPANDED_ATTRIBUTE, _EXPAND_TRIED_ATTRIBUTE,
+        timeout * 1000
+    )
+
+
 def text(post: WebElement) -> str:
+    if post.get_attribute(EXPANDED_ATTRIBUTE) is not None:  # Already expanded by expand_loaded_posts
+        return post.find_element(By.XPATH, xpaths.CONTENT_TEXT).get_attribute('innerText')
+
     try:
         see_more_el(post).click()
     except ElementNotInteractableException:
-        utils.warning('See More button found, but could not be clicked\n')
+        logger.warning('See More button found, but could not be clicked')
     except NoSuchElementException:
         pass
 
     try:
         show_original_el(post).click()
     except ElementNotInteractableException:
-        utils.warning('Show Original button found, but could not be clicked\n')
+        logger.warning('Show Original button found, but could not be clicked')
     except NoSuchElementException:
         pass
 
@@ -258,6 +419,110 @@ def more_comments_el(post: WebElement) -> WebElement:
     return post.find_element(By.XPATH, xpaths.MORE_COMMENTS)
 
 
+_EXPAND_COMMENTS_SCRIPT = '''
+var post = arguments[0], moreCommentsXPath = arguments[1], moreRepliesXPath = arguments[2],
+    commentXPath = arguments[3], maxDepth = arguments[4], limit = arguments[5], deadline = Date.now() + arguments[6],
+    roundTimeout = arguments[7];
+var done = arguments[arguments.length - 1];
+
+var query = function (xpath) {
+    var result = document.evaluate(xpath, post, null, XPathResult.ORDERED_NODE_SNAPSHOT_TYPE, null);
+    var nodes = [];
+    for (var i = 0; i < result.snapshotLength; i++) { nodes.push(result.snapshotItem(i)); }
+    return nodes;
+};
+// Nesting level of an element inside the comment threads: top level comments are in one list item, their
+// replies in two, and so on.
+var depthOf = function (el) {
+    var depth = 0;
+    for (var node = el.parentElement; node && node !== post; node = node.parentElement) {
+        if (node.tagName === 'LI') { depth++; }
+    }
+    return depth;
+};
+var closestButton = function (el) {
+    while (el && el !== post && el.getAttribute('role') !== 'button') { el = el.parentElement; }
+    return el === post ? null : el;
+};
+// Buttons are marked with their text when clicked, and not clicked again unless their text changed (e.g a "View more
+// comments" button that is reused for the next page of comments)
+var unclicked = function (button) { return button.__feedscraperClicked !== button.innerText; };
+
+var expand = function () {
+    var count = query(commentXPath).length;
+    var buttons = query(moreCommentsXPath);
+    // A reply button inside a comment at depth n expands comments of depth n + 1
+    query(moreRepliesXPath).forEach(function (el) { if (depthOf(el) <= maxDepth) { buttons.push(el); } });
+    buttons = buttons.map(closestButton).filter(function (el) { return el !== null && unclicked(el); });
+    if (count >= limit || buttons.length === 0 || Date.now() > deadline) { return collect(); }
+
+    buttons.forEach(function (button) {
+        button.__feedscraperClicked = button.innerText;
+        button.click();
+    });
+    // Wait for the clicked threads to load before looking for more buttons, giving up on the round if nothing loads
+    var roundDeadline = Date.now() + roundTimeout;
+    var wait = function () {
+        var now = Date.now();
+        if (query(commentXPath).length !== count || now > roundDeadline || now > deadline) { setTimeout(expand, 200); }
+        else { setTimeout(wait, 100); }
+    };
+    wait();
+};
+
+var collect = function () {
+    done(query(commentXPath).slice(0, limit).map(function (article) {
+        var author = article.querySelector('a[role="link"] span');
+        var text = article.querySelectorAll('div[dir="auto"]');
+        var time = article.querySelector('a[href*="comment_id"]:not([role="button"]) span')
+            || article.querySelector('ul li a[href*="comment_id"]');
+        var reactions = 0;
+        article.querySelectorAll('[aria-label]').forEach(function (el) {
+            var match = /^([0-9,]+) reactions?;/.exec(el.getAttribute('aria-label'));
+            if (match) { reactions = parseInt(match[1].replace(/,/g, ''), 10); }
+        });
+        return {
+            author: author ? author.innerText : null,
+            text: Array.prototype.map.call(text, function (el) { return el.innerText; }).join('\\n') || null,
+            time: time ? time.innerText : null,
+            reactions: reactions,
+            depth: depthOf(article) - 1
+        };
+    }));
+};
+expand();
+'''
+"""
+Repeatedly clicks the comment and reply expansion buttons of a post until no more are found within the depth limit,
+the comment limit is reached or the time runs out, and then returns all the comments in the post.
+"""
+
+
+def comments(post: WebElement, driver: WebDriver, *, depth: int = 1, limit: int = 100,
+             timeout: float = 20, round_timeout: float = 2) -> List[Comment]:
+    """
+    Expand the comment threads of a post and get its comments. The expansion and reading of the comments is done
+    in a single script inside the browser, rather than by clicking and reading each element through the webdriver.
+
+    :param post: post's WebElement
+    :param driver: the webdriver browsing facebook
+    :param depth: the depth of replies to expand. 0 expands only comments on the post itself, 1 also replies to them
+    and so on.
+    :param limit: stop expanding once this amount of comments was loaded, and return no more than it.
+    :param timeout: maximal time (in seconds) to spend expanding comments.
+    :param round_timeout: maximal time (in seconds) to wait for new comments after clicking expansion buttons, before
+    looking for more buttons. Buttons are only clicked once, so buttons that load nothing are then skipped.
+    :return: a list of Comment objects in the order they appear in the post
+    """
+    driver.set_script_timeout(timeout + 5)
+    payload = driver.execute_async_script(
+        _EXPAND_COMMENTS_SCRIPT,
+        post, xpaths.MORE_COMMENTS, xpaths.MORE_REPLIES, xpaths.COMMENT, depth, limit, timeout * 1000,
+        round_timeout * 1000
+    )
+    return [Comment(**comment) for comment in payload]
+
+
 def reaction_bar_el(post: WebElement) -> WebElement:
     return post.find_element(By.XPATH, xpaths.REACTIONS_BAR)
 
@@ -291,10 +556,36 @@ def reactions(post: WebElement, driver: WebDriver) -> Reactions:
         except NoSuchElementException:
             pass  #
         except (ElementNotInteractableException, StaleElementReferenceException):
-            utils.warning(f'Failed to grab {reaction_name} count: ')
-            utils.warning(traceback.format_exc())
+            logger.warning('Failed to grab %s count', reaction_name, exc_info=logger.isEnabledFor(logging.DEBUG))
             params[reaction_name] = None
-        print(reaction_name + ': ' + str(datetime.now() - start))
+        logger.debug('%s: %s', reaction_name, datetime.now() - start)
     # Get a list sorted by reaction name, as in the Reactions constructor
     params = [it[1] for it in sorted(params.items(), key=lambda it: it[0])]
     return Reactions(*params)
+
+
+_REACTION_LABELS_SCRIPT = '''
+var bar = document.evaluate(arguments[0], arguments[1], null, XPathResult.FIRST_ORDERED_NODE_TYPE, null)
+    .singleNodeValue;
+if (bar === null) { return null; }
+return Array.prototype.map.call(bar.querySelectorAll('[aria-label]'), function (el) {
+    return el.getAttribute('aria-label');
+});
+'''
+"""
+Returns the labels of the reaction buttons in a post, e.g. "Like: 1.2K people", in a single script call. Returns null
+if the post has no reaction bar.
+"""
+
+
+def reaction_counts(post: WebElement, driver: WebDriver) -> Optional[Reactions]:
+    """
+    Get post reaction counts from the labels of its reaction buttons, without hovering over them. This is much
+    cheaper than reactions(), but large counts are abbreviated in the labels (e.g "1.2K"), so they are approximate.
+
+    :param post: post's WebElement
+    :param driver: the webdriver browsing facebook
+    :return: the reaction counts, or None if the labels did not contain counts or the reaction bar was not found
+    """
+    labels = driver.execute_script(_REACTION_LABELS_SCRIPT, xpaths.REACTIONS_BAR, post)
+    return None if labels is None else reactions_from_labels(labels)
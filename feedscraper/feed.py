@@ -1,27 +1,36 @@
-import traceback
+import logging
 from collections import namedtuple
 from datetime import date
-from time import sleep
+from time import sleep, monotonic
 from typing import List
 
 from selenium import webdriver
-from selenium.common.exceptions import NoSuchElementException
+from selenium.common.exceptions import NoSuchElementException, WebDriverException, TimeoutException
 from selenium.webdriver import ActionChains
 from selenium.webdriver.common.by import By
-from webdriver_manager.chrome import ChromeDriverManager
+from selenium.webdriver.support import expected_conditions
+from selenium.webdriver.support.wait import WebDriverWait
 
-from feedscraper import utils, extractors
-from feedscraper.post import Post
+from feedscraper import extractors, xpaths, log
+from feedscraper.checkpoint import Checkpoint
+from feedscraper.post import Post, ExtractionPlan
+from feedscraper.session import Session
 from feedscraper.extractors import Field
 
+logger = log.get_logger(__name__)
+
 
 class Feed:
     """
     Represents a facebook feed that can be scrolled to get posts, potentially up to infinity.
     """
     SCROLL_PAUSE = 1.2
+    COMMENT_DEPTH = 1
+    """Depth of reply threads to expand when collecting comments. 0 expands only comments on the post itself."""
+    COMMENT_LIMIT = 100
+    """Maximal amount of comments to collect from each post"""
 
-    def __init__(self, email, password, *, data_dir=None):
+    def __init__(self, email, password, *, data_dir=None, cookie_file=None):
         """
         logs in to facebook and displays a feed.
 
@@ -30,29 +39,42 @@ class Feed:
         :param data_dir: a directory which will function as a chrome profile, containing cookies and other data.
         Specifying the same data directory over different sessions allows you to simulate characters that use
         facebook over time. If not specified, the session will be isolated.
+        :param cookie_file: a JSON file to persist the session cookies in. A session saved in it is reused while
+        valid, so the user is only logged in again after it expires.
         """
         self.email = email
         self.password = password
+        self.data_dir = data_dir
+        self.cookie_file = cookie_file
+        self._start()
 
+    def _start(self):
+        """Start the browser and log in"""
         options = webdriver.ChromeOptions()
         options.add_experimental_option("prefs", {
             "profile.default_content_setting_values.notifications": 1
         })  # Avoids  "Allow Notification" pop-ups
-        if data_dir is not None:
-            options.add_argument(f'user-data-dir={data_dir}')
-        self.driver = webdriver.Chrome(ChromeDriverManager().install())
+        if self.data_dir is not None:
+            options.add_argument(f'user-data-dir={self.data_dir}')
+        from webdriver_manager.chrome import ChromeDriverManager  # Only needed to start a browser, so loaded lazily
+        self.driver = webdriver.Chrome(ChromeDriverManager().install(), options=options)
         self.actions = ActionChains(self.driver)
-
-        self.driver.get("https://www.facebook.com")
         self.driver.implicitly_wait(0.5)
 
+        self.session = Session(self.driver, self.cookie_file)
+        if not self.session.start(self.email, self.password):
+            logger.error('Failed to log in as %s', self.email)
+
+    def restart(self):
+        """
+        Quit the browser and start a new one with the same profile, back at the feed. This frees the memory the
+        browser accumulated over long sessions.
+        """
         try:
-            self.driver.find_element(By.ID, 'email').send_keys(email)
-            self.driver.find_element(By.ID, 'pass').send_keys(password)
-            self.driver.find_element(By.NAME, 'login').click()  # Send mouse click
-            self.driver.implicitly_wait(0.5)
-        except NoSuchElementException:  # Already logged in
+            self.driver.quit()
+        except WebDriverException:  # Browser already crashed
             pass
+        self._start()
 
     def __del__(self):
         try:
@@ -88,8 +110,7 @@ class Feed:
         :return: A list of namedtuples for the ads currently displaying in the sidebar,
         containing text and link attributes.
         """
-        ads_text = self.driver.find_elements(
-            By.XPATH, '//a[@aria-label="Advertiser" and @rel="nofollow noopener"]/div/div/div/span')
+        ads_text = self.driver.find_elements(By.XPATH, xpaths.SIDEBAR_AD_TEXT)
 
         return list(  # convert to list
             map(lambda lst: Feed.SidebarAd(*lst),  # top line is name, bottom is link
@@ -97,10 +118,35 @@ class Feed:
                     map(lambda el: el.text, ads_text))))  # get text
 
 
+class BrowseStats:
+    """
+    Metrics of a browse call, updated while its posts are generated.
+    """
+
+    def __init__(self):
+        self.buffer_depth = 0
+        """The amount of loaded feed units that were not parsed yet, as of the last post"""
+        self.prefetches = 0
+        """The amount of scroll-loads triggered ahead of time (see the prefetch parameter of HomeFeed.browse)"""
+        self.stalls = 0
+        """The amount of times browsing ran out of loaded units and waited for more to load"""
+        self.stall_time = 0.0
+        """Total time (in seconds) spent waiting for more units to load"""
+
+    def __repr__(self):
+        return (f'BrowseStats(buffer_depth={self.buffer_depth}, prefetches={self.prefetches}, stalls={self.stalls}, '
+                f'stall_time={self.stall_time:.1f})')
+
+
 class HomeFeed(Feed):
     """Feed browsing the home page"""
 
-    def __init__(self, email, password, *, data_dir=None):
+    FEED_LOAD_TIMEOUT = 10
+    """Time (in seconds) to wait for the feed to be displayed after logging in"""
+    PREFETCH_RETRY = 5
+    """Time (in seconds) after which a prefetch that loaded no new units is triggered again"""
+
+    def __init__(self, email, password, *, data_dir=None, cookie_file=None):
         """
         logs in to facebook and displays the home feed.
 
@@ -112,21 +158,129 @@ class HomeFeed(Feed):
         :param data_dir: a directory which will function as a chrome profile, containing cookies and other data.
         Specifying the same data directory over different sessions allows you to simulate characters that use
         facebook over time. If not specified, the session will be isolated.
+        :param cookie_file: a JSON file to persist the session cookies in. A session saved in it is reused while
+        valid, so the user is only logged in again after it expires.
         """
 
-        super(HomeFeed, self).__init__(email, password, data_dir=data_dir)
+        self.stats = BrowseStats()
+        """Metrics of the last browse call"""
+        super(HomeFeed, self).__init__(email, password, data_dir=data_dir, cookie_file=cookie_file)
+
+    def _start(self):
+        super(HomeFeed, self)._start()
         # If running in a fresh profile and the user sees arrow-UI headings, the first page will always
         # be an empty welcome screen, and the home button should be pressed to get the feed.
-        try:
-            self.driver.find_element(By.XPATH, '//a[@aria-label="Home"]').click()
-            utils.confirm('Clicked home')
-            sleep(3)
-        except NoSuchElementException:
-            pass
+        if not self.driver.find_elements(By.XPATH, xpaths.FEED):
+            try:
+                self.driver.find_element(By.XPATH, '//a[@aria-label="Home"]').click()
+                logger.info('Clicked home')
+            except NoSuchElementException:
+                pass
+            try:
+                WebDriverWait(self.driver, HomeFeed.FEED_LOAD_TIMEOUT) \
+                    .until(expected_conditions.presence_of_element_located((By.XPATH, xpaths.FEED)))
+            except TimeoutException:
+                logger.warning('Feed was not displayed after logging in')
 
         self.driver.implicitly_wait(5)
 
-    def browse(self, fields=None):
+    def _feed_el(self):
+        """Find the feed element, exiting if it is not found"""
+        try:
+            return self.driver.find_element(By.XPATH, '//div[@role="feed"]')
+        except NoSuchElementException as e:
+            logger.error('Could not find feed element! %s', e, exc_info=logger.isEnabledFor(logging.DEBUG))
+            exit(1)
+
+    def _recycle(self, watchdog, expand_text):
+        """
+        Restart the browser in the middle of browsing.
+
+        :return: the new feed element
+        """
+        self.restart()
+        watchdog.restarts += 1
+        feed_el = self._feed_el()
+        if expand_text:
+            extractors.expand_loaded_posts(self.driver)
+        return feed_el
+
+    def _recover(self, watchdog, expand_text, post_count):
+        """
+        Handle a WebDriverException raised while browsing, by restarting the browser if it crashed. Should be called
+        while handling the exception, which is re-raised if it was not caused by a crash.
+
+        :return: the new feed element
+        """
+        if watchdog is None or not watchdog.is_crashed(self.driver):
+            raise
+        logger.warning('Browser crashed after %d posts', post_count)
+        return self._recycle(watchdog, expand_text)
+
+    def _parse_unit(self, feed_el, index, plan, state, sampler, capture_html):
+        """
+        Parse the feed unit at the given index into a Post object.
+
+        :return: the parsed post, or None if the post was already generated according to the checkpoint state.
+        """
+        post_element = extractors.post_el(feed_el, index)
+        key = None
+        if state is not None or sampler is not None:
+            key = extractors.post_key(post_element, self.driver)
+            if state is not None and key in state.seen:
+                return None
+
+        if sampler is None:
+            post = Post.from_home_element(self, post_element, plan)
+        else:
+            census = extractors.census(post_element, self.driver)
+            if sampler.select(key, census):
+                post = Post.from_home_element(self, post_element, plan)
+                # Fill in census fields that were not requested, since they were extracted anyway
+                post.metadata = post.metadata._replace(user=post.metadata.user or census.user,
+                                                       page=post.metadata.page or census.page)
+                post.sponsored = census.sponsored if post.sponsored is None else post.sponsored
+                post.recommended = census.recommended if post.recommended is None else post.recommended
+            else:
+                post = Post.from_census(self, post_element, census)
+
+        if capture_html:
+            post.html = post_element.get_attribute('outerHTML')
+        if state is not None:
+            state.seen.add(key)
+        return post
+
+    def _prefetch(self, index, low_water, pending, expand_text):
+        """
+        Scroll to the bottom of the page without waiting if fewer than low_water loaded units are left to parse, so
+        more units are loaded while the loaded ones are parsed. Units that were loaded since the last call are expanded
+        if expand_text is set.
+
+        :param pending: the unit count and time of the last prefetch and the unit count of the last expansion, as
+        returned by the last call
+        :return: the updated pending tuple
+        """
+        loaded = extractors.loaded_unit_count(self.driver)
+        self.stats.buffer_depth = max(loaded - index, 0)
+        prefetch_count, prefetch_time, expand_count = pending
+
+        if expand_text and loaded != expand_count:
+            extractors.expand_loaded_posts(self.driver)
+            expand_count = loaded
+
+        # Wait for a triggered load to arrive before triggering another
+        if self.stats.buffer_depth < low_water and \
+                (loaded != prefetch_count or monotonic() - prefetch_time >= HomeFeed.PREFETCH_RETRY):
+            # Posts are scrolled back into view when hovered over, so the page is left at the bottom while loading
+            self.scroll_to_pos('document.body.scrollHeight')
+            self.stats.prefetches += 1
+            logger.debug('Prefetching with %d units buffered', self.stats.buffer_depth)
+            prefetch_count, prefetch_time = loaded, monotonic()
+
+        return prefetch_count, prefetch_time, expand_count
+
+    def browse(self, fields=None, *, checkpoint=None, checkpoint_interval=50, expand_text=False, watchdog=None,
+               sampler=None, prefetch=None, capture_html=False):
         """
         A generator iterating posts.
         Each post generated will scroll the page and hover over elements as necessary.
@@ -139,62 +293,138 @@ class HomeFeed(Feed):
 
         :param fields: the fields to collect for each post. For a complete list,
         see the Field enum in the extractors' module. By default, all of them.
+        :param checkpoint: path of a checkpoint file. If given, the browsing state is periodically saved to it, and
+        if it already exists, browsing resumes from the saved state: posts that were already generated are skipped
+        without being parsed. A Checkpoint object may be given instead, in which case browsing resumes from it and
+        adds the generated posts to it, but saving it is left to the caller (e.g. only once the posts were stored).
+        :param checkpoint_interval: the amount of posts generated between checkpoint saves.
+        :param expand_text: expand the text of all loaded posts at once after each scroll, in a single script,
+        instead of clicking their "See more" and "See original" buttons one post at a time.
+        :param watchdog: a Watchdog monitoring the browser's resource use. When it crosses the watchdog's thresholds
+        or crashes, the browser is restarted and browsing continues, skipping posts that were already generated.
+        :param sampler: a Sampler choosing posts for full extraction. If given, every post gets a cheap census
+        (user, page, sponsored and recommended) and only the posts chosen by the sampler are extracted according to
+        fields. The tier attribute of each post tells which it got.
+        :param prefetch: a low-water mark of loaded posts. If given, more posts are loaded as soon as fewer than this
+        amount of loaded posts are left to parse, instead of when they run out, so loading overlaps with parsing.
+        The stats attribute tracks the amount of buffered posts and the time spent waiting for posts to load.
+        :param capture_html: set the html attribute of each post to its element's outer HTML, e.g. to be parsed by a
+        parsing.ParsePool. Combined with fields=[], posts are captured without extracting anything in the browser.
 
         :return: a generator iterating over the posts in the feed as post object
         """
 
-        fields = list(Field) if fields is None else fields # If no fields specified set to all
+        self.stats = BrowseStats()
+        plan = ExtractionPlan(fields)  # If no fields specified, all of them are extracted
+        expand_text = expand_text and Field.TEXT in plan
 
         self.scroll_to_top()
 
         # First, find the feed element
-        try:
-            feed_el = self.driver.find_element(By.XPATH, '//div[@role="feed"]')
-        except NoSuchElementException as e:
-            utils.error('Could not find feed element!')
-            print(e)
-            traceback.format_exc()
-            exit(1)
+        feed_el = self._feed_el()
 
         i = 1  # Post index (XPath index starts from 1)
         post_count = 0  # Count of posts found
+
+        state = None
+        save = False  # Whether the checkpoint is saved here, rather than by the caller
+        if isinstance(checkpoint, Checkpoint):
+            state = checkpoint
+        elif checkpoint is not None:
+            state = Checkpoint.load(checkpoint)
+            save = True
+        elif watchdog is not None:  # Seen posts are needed to resume after restarts
+            state = Checkpoint(None)
+
+        if state is not None:
+            post_count = state.post_count
+            if state.index > 1:
+                # If the page the checkpoint was taken on is still open (the unit before the saved index is a post
+                # that was already seen), continue from the same unit. Otherwise, the feed is browsed from the start,
+                # skipping posts that were already seen.
+                try:
+                    previous = extractors.post_el(feed_el, state.index - 1)
+                    same_page = extractors.post_key(previous, self.driver) in state.seen
+                except NoSuchElementException:
+                    same_page = False
+                if same_page:
+                    i = state.index
+                    self.scroll_to_pos(state.scroll_position)
+                else:
+                    logger.info('Resuming from checkpoint with %d seen posts', len(state.seen))
+
+        if expand_text:
+            extractors.expand_loaded_posts(self.driver)
+
         scroll_fail_count = 0  # Times scrolled to the bottom without finding a post
-        # After failing to find any posts after 10 scroll attempts, assume the feed is over and exit.
-        while scroll_fail_count < 10:
-            try:
-                yield Post.from_home_element(
-                    self,
-                    extractors.post_el(feed_el, i),
-                    fields=fields
-                )
-            except NoSuchElementException as e:
-                # Set warning variables
-                scroll_fail_count += 1  # When this reaches 10 the loop should end.
-                load_fail_count = 0
-
-                # Warn
-                utils.warning(f'{post_count} Scroll Fail Count: {scroll_fail_count}')
-                utils.warning(str(e))
-
-                # Try to load more posts
-                self.scroll_to_bottom()
-                sleep(Feed.SCROLL_PAUSE)
-
-                while load_fail_count < 10:  # Try to wait for the post to load in 0.5 seconds intervals
+        pending = (None, 0.0, None)  # See _prefetch
+        try:
+            # After failing to find any posts after 10 scroll attempts, assume the feed is over and exit.
+            while scroll_fail_count < 10:
+                post = None
+                try:
+                    # Crashes are handled here, so those surfacing while waiting for posts to load are also caught
                     try:
-                        yield Post.from_home_element(
-                            self,
-                            extractors.post_el(feed_el, i),
-                            fields=fields
-                        )
-                        scroll_fail_count = 0
-                        load_fail_count = 0
-                        break
+                        if prefetch is not None:
+                            pending = self._prefetch(i, prefetch, pending, expand_text)
+                        post = self._parse_unit(feed_el, i, plan, state, sampler, capture_html)
                     except NoSuchElementException as e:
-                        sleep(0.5)
-                        load_fail_count += 1
-                        utils.warning(f'{post_count} Load fail count: {load_fail_count}')
-                        utils.warning(traceback.format_exc())
-                        utils.warning(str(e))
-            finally:
-                i += 1
+                        # Set warning variables
+                        scroll_fail_count += 1  # When this reaches 10 the loop should end.
+                        load_fail_count = 0
+
+                        # Warn
+                        logger.warning('%d Scroll Fail Count: %d (%s)', post_count, scroll_fail_count, e.msg)
+
+                        # Try to load more posts
+                        stall_start = monotonic()
+                        self.stats.stalls += 1
+                        self.scroll_to_bottom()
+                        sleep(Feed.SCROLL_PAUSE)
+
+                        while load_fail_count < 10:  # Try to wait for the post to load in 0.5 seconds intervals
+                            if expand_text:
+                                extractors.expand_loaded_posts(self.driver)
+                            try:
+                                post = self._parse_unit(feed_el, i, plan, state, sampler, capture_html)
+                                scroll_fail_count = 0
+                                load_fail_count = 0
+                                break
+                            except NoSuchElementException:
+                                sleep(0.5)
+                                load_fail_count += 1
+                                logger.warning('%d Load fail count: %d', post_count, load_fail_count)
+                                logger.debug('Failed to load post %d', i, exc_info=True)
+                        self.stats.stall_time += monotonic() - stall_start
+                except WebDriverException:
+                    feed_el = self._recover(watchdog, expand_text, post_count)
+                    i = 0  # Incremented to the first unit below
+                    scroll_fail_count = 0
+                    continue
+                finally:
+                    i += 1
+
+                if post is not None:
+                    post_count += 1
+                    yield post
+                    try:
+                        if save and post_count % checkpoint_interval == 0:
+                            state.update(i, post_count, self.get_scroll_position())
+                            state.save()
+                        if watchdog is not None and watchdog.should_recycle(self.driver, post_count):
+                            feed_el = self._recycle(watchdog, expand_text)
+                            i = 1
+                            scroll_fail_count = 0
+                    except WebDriverException:  # E.g the renderer died while the watchdog sampled it
+                        feed_el = self._recover(watchdog, expand_text, post_count)
+                        i = 1
+                        scroll_fail_count = 0
+        finally:
+            # Save the final state, also when the generator is closed or the browser crashed
+            if save:
+                try:
+                    scroll_position = self.get_scroll_position()
+                except WebDriverException:
+                    scroll_position = state.scroll_position
+                state.update(i, post_count, scroll_position)
+                state.save()
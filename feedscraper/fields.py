@@ -0,0 +1,76 @@
+"""
+Definitions of the data scraped from posts. These have no dependency on the browser stack, so they can be imported
+for offline processing of scraped data without loading selenium.
+"""
+import re
+from collections import namedtuple
+from enum import Enum
+from typing import Iterable, Optional
+
+
+class Field(Enum):
+    USER = 'user'
+    PAGE = 'page'
+    TIMESTAMP = 'timestamp'
+    TEXT = 'text'
+    REACTIONS = 'reactions'
+    SPONSORED = 'sponsored'
+    RECOMMENDED = 'recommended'
+    LIKED = 'liked'
+    URL = 'url'
+    COMMENTS = 'comments'
+
+
+class Tier(Enum):
+    """
+    How thoroughly a post was extracted: a census post has only the fields that can be extracted cheaply (user, page,
+    sponsored and recommended), and a full post has all the requested fields.
+    """
+    CENSUS = 'census'
+    FULL = 'full'
+
+
+class Reaction(Enum):
+    """
+    An enum containing currently available facebook reactions
+    """
+    ANGRY = "angry"
+    CARE = "care"
+    HAHA = "haha"
+    LIKE = "like"
+    LOVE = "love"
+    SAD = "sad"
+    WOW = "wow"
+
+
+Metadata = namedtuple('Metadata', ['user', 'page', 'timestamp'])
+"""A namedtuple class that contains user, page and timestamp of a post"""
+Reactions = namedtuple('Reactions', sorted([reaction.name.lower() for reaction in Reaction]))
+"""A named tuple class that contain attributes for each of the reactions specified in Reaction"""
+Comment = namedtuple('Comment', ['author', 'text', 'time', 'reactions', 'depth'])
+"""
+A namedtuple class that contains a comment's author, text, relative posting time (e.g "2h") as displayed, reaction
+count and depth (0 for comments on the post, 1 for replies to them, etc.)
+"""
+Census = namedtuple('Census', ['user', 'page', 'sponsored', 'recommended'])
+"""A namedtuple class that contains the fields of a post extracted in a census (see Tier)"""
+
+_REACTION_LABEL_COUNT = re.compile(r'^([^:]+):\s*([0-9][0-9.,]*)\s*([KM]?)\b')
+_COUNT_MULTIPLIERS = {'': 1, 'K': 1000, 'M': 1000000}
+
+
+def reactions_from_labels(labels: Iterable[str]) -> Optional[Reactions]:
+    """
+    Get reaction counts from the labels of a post's reaction buttons (e.g "Like: 1.2K people"). Large counts are
+    abbreviated in the labels, so they are approximate.
+
+    :return: the reaction counts, or None if the labels did not contain counts
+    """
+    params = {reaction.name.lower(): 0 for reaction in Reaction}
+    for label in labels:
+        match = _REACTION_LABEL_COUNT.match(label)
+        if match is None or match.group(1).lower() not in params:
+            return None
+        params[match.group(1).lower()] = round(float(match.group(2).replace(',', ''))
+                                               * _COUNT_MULTIPLIERS[match.group(3)])
+    return Reactions(**params)
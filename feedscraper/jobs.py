@@ -0,0 +1,347 @@
+"""
+Queues of persona scraping jobs, for spreading personas over several workers (see the worker module).
+
+Jobs are leased by workers for a limited time, which the workers extend with heartbeats while they run. A job whose
+worker died is leased again once its lease expires, so no job is lost. A persona is only leased to one worker at a
+time, so no two workers share a chrome profile.
+
+Two backends are provided: SQLiteQueue, which keeps the queue in an SQLite file, and BrokerClient, which accesses a
+queue served over TCP by a Broker. The broker is a simple stand-in for a real message broker: it has no
+authentication and should only be used in trusted networks.
+"""
+import json
+import socket
+import socketserver
+import sqlite3
+from time import time
+from typing import List, Optional
+
+from feedscraper import log
+
+logger = log.get_logger(__name__)
+
+
+class Job:
+    """
+    A scraping job of a persona: the login and profile of the persona, the fields to collect and when to stop.
+    """
+
+    def __init__(self, persona: str, email: str, password: str, *, data_dir: str = None, cookie_file: str = None,
+                 fields: List[str] = None, max_posts: int = None, max_seconds: float = None, id: int = None):
+        """
+        :param persona: the name of the persona. Only one job of each persona runs at a time.
+        :param email: the email of the user to log in to
+        :param password: the password of the user to log in to
+        :param data_dir: the persona's chrome profile directory (see Feed)
+        :param cookie_file: the persona's session cookie file (see Feed)
+        :param fields: names of the fields to collect (see Field). By default, all of them.
+        :param max_posts: stop the job after collecting this amount of posts
+        :param max_seconds: stop the job after browsing for this amount of seconds
+        :param id: the job's ID in its queue. Set by the queue.
+        """
+        self.id = id
+        self.persona = persona
+        self.email = email
+        self.password = password
+        self.data_dir = data_dir
+        self.cookie_file = cookie_file
+        self.fields = fields
+        self.max_posts = max_posts
+        self.max_seconds = max_seconds
+
+    def to_dict(self) -> dict:
+        return dict(vars(self))
+
+    @staticmethod
+    def from_dict(attributes: dict) -> 'Job':
+        attributes = dict(attributes)
+        return Job(attributes.pop('persona'), attributes.pop('email'), attributes.pop('password'), **attributes)
+
+    def __repr__(self):
+        return f'Job(id={self.id!r}, persona={self.persona!r})'
+
+
+class JobQueue:
+    """
+    Interface of job queue backends. All methods taking a worker only succeed while that worker holds the job's lease.
+    """
+    MAX_ATTEMPTS = 3
+    """The amount of times a job is attempted before it is marked as failed"""
+
+    def put(self, job: Job) -> int:
+        """
+        Add a job to the queue.
+
+        :return: the job's ID
+        """
+        raise NotImplementedError
+
+    def lease(self, worker: str, seconds: float) -> Optional[Job]:
+        """
+        Lease the next available job: pending, or leased by a worker whose lease expired, and of a persona not
+        leased by another worker. Jobs leased by the same worker are also given back, so a restarted worker picks
+        up its previous job. Jobs whose lease expired after MAX_ATTEMPTS attempts (e.g. their workers kept dying) are
+        marked as failed instead.
+
+        :param worker: ID of the leasing worker
+        :param seconds: the lease's duration
+        :return: the leased job, or None if no job is available
+        """
+        raise NotImplementedError
+
+    def heartbeat(self, job_id: int, worker: str, seconds: float) -> bool:
+        """
+        Extend the lease of a job.
+
+        :return: whether the worker still holds the lease
+        """
+        raise NotImplementedError
+
+    def submit_results(self, job_id: int, worker: str, records: List[dict]) -> bool:
+        """
+        Add a batch of results of a job.
+
+        :return: whether the results were accepted (the worker still holds the lease)
+        """
+        raise NotImplementedError
+
+    def complete(self, job_id: int, worker: str) -> bool:
+        """Mark a job as done, releasing its persona"""
+        raise NotImplementedError
+
+    def fail(self, job_id: int, worker: str, error: str) -> bool:
+        """
+        Release a job after an error. It is returned to the queue, or marked as failed after MAX_ATTEMPTS attempts.
+        """
+        raise NotImplementedError
+
+    def results(self, job_id: int) -> List[dict]:
+        """Get the results submitted for a job, in submission order"""
+        raise NotImplementedError
+
+
+class SQLiteQueue(JobQueue):
+    """
+    A job queue kept in an SQLite file, which can be shared by workers on the same machine (or through the Broker).
+    Each operation uses its own connection, so the queue can be used from several threads.
+    """
+
+    def __init__(self, path: str):
+        """
+        :param path: the queue's database file. Created if it does not exist.
+        """
+        self.path = path
+        db = self._connect()
+        try:
+            db.executescript('''
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    persona TEXT NOT NULL,
+                    payload TEXT NOT NULL,
+                    state TEXT NOT NULL DEFAULT 'pending',
+                    worker TEXT,
+                    lease_until REAL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    error TEXT
+                );
+                CREATE TABLE IF NOT EXISTS results (
+                    job_id INTEGER NOT NULL REFERENCES jobs(id),
+                    record TEXT NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS results_by_job ON results(job_id);
+            ''')
+        finally:
+            db.close()
+
+    def _connect(self) -> sqlite3.Connection:
+        # Transactions are managed explicitly, so leasing can take the write lock before reading
+        db = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        db.execute('PRAGMA journal_mode=WAL')
+        return db
+
+    def _update_leased(self, sql: str, params: tuple, job_id: int, worker: str) -> bool:
+        db = self._connect()
+        try:
+            cursor = db.execute(f'{sql} WHERE id = ? AND worker = ? AND state = \'leased\'', params + (job_id, worker))
+            return cursor.rowcount == 1
+        finally:
+            db.close()
+
+    def put(self, job: Job) -> int:
+        db = self._connect()
+        try:
+            payload = job.to_dict()
+            payload.pop('id')
+            cursor = db.execute('INSERT INTO jobs (persona, payload) VALUES (?, ?)', (job.persona, json.dumps(payload)))
+            return cursor.lastrowid
+        finally:
+            db.close()
+
+    def lease(self, worker: str, seconds: float) -> Optional[Job]:
+        now = time()
+        db = self._connect()
+        try:
+            db.execute('BEGIN IMMEDIATE')
+            db.execute('''
+                UPDATE jobs SET state = 'failed', error = COALESCE(error, 'Lease expired')
+                WHERE state = 'leased' AND lease_until < ? AND attempts >= ?
+            ''', (now, self.MAX_ATTEMPTS))
+            row = db.execute('''
+                SELECT id, payload FROM jobs AS job
+                WHERE (state = 'pending' OR (state = 'leased' AND (lease_until < :now OR worker = :worker)))
+                AND NOT EXISTS (
+                    SELECT 1 FROM jobs AS other
+                    WHERE other.persona = job.persona AND other.id != job.id AND other.state = 'leased'
+                    AND other.lease_until >= :now AND other.worker != :worker
+                )
+                ORDER BY id LIMIT 1
+            ''', {'now': now, 'worker': worker}).fetchone()
+            if row is None:
+                db.execute('COMMIT')
+                return None
+
+            db.execute('UPDATE jobs SET state = \'leased\', worker = ?, lease_until = ?, attempts = attempts + 1 '
+                       'WHERE id = ?', (worker, now + seconds, row[0]))
+            db.execute('COMMIT')
+        except sqlite3.Error:
+            db.execute('ROLLBACK')
+            raise
+        finally:
+            db.close()
+
+        job = Job.from_dict(json.loads(row[1]))
+        job.id = row[0]
+        return job
+
+    def heartbeat(self, job_id: int, worker: str, seconds: float) -> bool:
+        return self._update_leased('UPDATE jobs SET lease_until = ?', (time() + seconds,), job_id, worker)
+
+    def submit_results(self, job_id: int, worker: str, records: List[dict]) -> bool:
+        db = self._connect()
+        try:
+            db.execute('BEGIN IMMEDIATE')
+            leased = db.execute('SELECT 1 FROM jobs WHERE id = ? AND worker = ? AND state = \'leased\'',
+                                (job_id, worker)).fetchone()
+            if leased is not None:
+                db.executemany('INSERT INTO results (job_id, record) VALUES (?, ?)',
+                               [(job_id, json.dumps(record)) for record in records])
+            db.execute('COMMIT')
+            return leased is not None
+        finally:
+            db.close()
+
+    def complete(self, job_id: int, worker: str) -> bool:
+        return self._update_leased('UPDATE jobs SET state = \'done\', lease_until = NULL', (), job_id, worker)
+
+    def fail(self, job_id: int, worker: str, error: str) -> bool:
+        return self._update_leased(
+            'UPDATE jobs SET state = CASE WHEN attempts >= ? THEN \'failed\' ELSE \'pending\' END, '
+            'lease_until = NULL, error = ?',
+            (self.MAX_ATTEMPTS, error), job_id, worker
+        )
+
+    def results(self, job_id: int) -> List[dict]:
+        db = self._connect()
+        try:
+            rows = db.execute('SELECT record FROM results WHERE job_id = ? ORDER BY rowid', (job_id,)).fetchall()
+            return [json.loads(row[0]) for row in rows]
+        finally:
+            db.close()
+
+
+_BROKER_METHODS = ['put', 'lease', 'heartbeat', 'submit_results', 'complete', 'fail', 'results']
+
+
+class Broker(socketserver.ThreadingTCPServer):
+    """
+    Serves a job queue over TCP, to BrokerClient queues on other machines. Requests and responses are JSON lines.
+    """
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, queue: JobQueue, host: str = 'localhost', port: int = 7340):
+        """
+        :param queue: the queue to serve
+        :param host: the address to listen on
+        :param port: the port to listen on
+        """
+        self.queue = queue
+        super().__init__((host, port), _BrokerHandler)
+
+
+class _BrokerHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        for line in self.rfile:
+            try:
+                request = json.loads(line)
+                if request['method'] not in _BROKER_METHODS:
+                    raise ValueError(f'Unknown method {request["method"]}')
+                args = request['args']
+                if request['method'] == 'put':
+                    args = [Job.from_dict(args[0])]
+                result = getattr(self.server.queue, request['method'])(*args)
+                if isinstance(result, Job):
+                    result = result.to_dict()
+                response = {'result': result}
+            except Exception as e:
+                logger.warning('Broker request failed: %r', e)
+                response = {'error': repr(e)}
+            self.wfile.write(json.dumps(response).encode() + b'\n')
+
+
+class BrokerClient(JobQueue):
+    """
+    A job queue served by a Broker. Each operation uses its own connection, so the queue can be used from several
+    threads.
+    """
+
+    def __init__(self, host: str, port: int = 7340, timeout: float = 30):
+        """
+        :param host: the broker's address
+        :param port: the broker's port
+        :param timeout: time (in seconds) to wait for the broker to respond
+        """
+        self.address = (host, port)
+        self.timeout = timeout
+
+    def _call(self, method: str, *args):
+        with socket.create_connection(self.address, timeout=self.timeout) as connection:
+            connection.sendall(json.dumps({'method': method, 'args': args}).encode() + b'\n')
+            response = json.loads(connection.makefile('rb').readline())
+        if 'error' in response:
+            raise RuntimeError(f'Broker error in {method}: {response["error"]}')
+        return response['result']
+
+    def put(self, job: Job) -> int:
+        return self._call('put', job.to_dict())
+
+    def lease(self, worker: str, seconds: float) -> Optional[Job]:
+        job = self._call('lease', worker, seconds)
+        return None if job is None else Job.from_dict(job)
+
+    def heartbeat(self, job_id: int, worker: str, seconds: float) -> bool:
+        return self._call('heartbeat', job_id, worker, seconds)
+
+    def submit_results(self, job_id: int, worker: str, records: List[dict]) -> bool:
+        return self._call('submit_results', job_id, worker, records)
+
+    def complete(self, job_id: int, worker: str) -> bool:
+        return self._call('complete', job_id, worker)
+
+    def fail(self, job_id: int, worker: str, error: str) -> bool:
+        return self._call('fail', job_id, worker, error)
+
+    def results(self, job_id: int) -> List[dict]:
+        return self._call('results', job_id)
+
+
+def open_queue(url: str) -> JobQueue:
+    """
+    Open a job queue by URL: sqlite:///path/to/queue.db for an SQLiteQueue, or tcp://host:port for a BrokerClient.
+    """
+    if url.startswith('sqlite://'):
+        return SQLiteQueue(url[len('sqlite://'):])
+    if url.startswith('tcp://'):
+        host, _, port = url[len('tcp://'):].partition(':')
+        return BrokerClient(host, int(port) if port else 7340)
+    raise ValueError(f'Unsupported queue URL: {url}')
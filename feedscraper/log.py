@@ -0,0 +1,112 @@
+"""
+Logging for the library. Every module logs to a child of the "feedscraper" logger, which by default emits nothing;
+call configure() (or attach your own handlers) to see the messages.
+
+Messages use logging's lazy %-formatting, so messages below the enabled level cost close to nothing, and tracebacks
+are logged with exc_info at the debug level, so they are only formatted when debug messages are enabled.
+"""
+import json
+import logging
+import sys
+from time import monotonic
+
+LOGGER_NAME = 'feedscraper'
+
+logging.getLogger(LOGGER_NAME).addHandler(logging.NullHandler())
+
+
+def get_logger(name: str) -> logging.Logger:
+    """
+    Get the logger of a library module.
+
+    :param name: the module's __name__
+    """
+    return logging.getLogger(name if name.startswith(LOGGER_NAME) else f'{LOGGER_NAME}.{name}')
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    Limits repeated messages: each message template (per logger and level) may be emitted up to `burst` times every
+    `interval` seconds. The amount of messages suppressed is added to the next emitted message of the same template.
+    """
+
+    def __init__(self, burst: int = 5, interval: float = 10):
+        """
+        :param burst: the amount of messages of a template allowed in an interval
+        :param interval: the length of the interval, in seconds
+        """
+        super().__init__()
+        self.burst = burst
+        self.interval = interval
+        self.windows = {}  # (logger, level, template) -> [window start, count in window, suppressed count]
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        key = (record.name, record.levelno, record.msg)
+        now = monotonic()
+        window = self.windows.get(key)
+        if window is None or now - window[0] >= self.interval:
+            suppressed = 0 if window is None else window[2]
+            window = self.windows[key] = [now, 0, suppressed]
+
+        if window[1] >= self.burst:
+            window[2] += 1
+            return False
+
+        window[1] += 1
+        if window[2]:
+            record.suppressed = window[2]
+            window[2] = 0
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """Formats records as single-line JSON objects"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'time': self.formatTime(record),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        if getattr(record, 'suppressed', 0):
+            entry['suppressed'] = record.suppressed
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry)
+
+
+class TextFormatter(logging.Formatter):
+    """The default text format, noting suppressed repetitions of messages"""
+
+    def __init__(self):
+        super().__init__('%(asctime)s %(levelname)s %(name)s: %(message)s')
+
+    def format(self, record: logging.LogRecord) -> str:
+        text = super().format(record)
+        if getattr(record, 'suppressed', 0):
+            text += f' ({record.suppressed} similar messages suppressed)'
+        return text
+
+
+def configure(level=logging.WARNING, *, json_output: bool = False, stream=None, rate_limit: bool = True) \
+        -> logging.Handler:
+    """
+    Set up output of the library's log messages.
+
+    :param level: the minimal level of messages to output. Use logging.DEBUG to see per-field extraction times and
+    tracebacks.
+    :param json_output: output messages as JSON lines instead of text
+    :param stream: the stream to write to. stderr by default.
+    :param rate_limit: limit repeated messages (see RateLimitFilter)
+    :return: the handler added to the library's logger
+    """
+    handler = logging.StreamHandler(sys.stderr if stream is None else stream)
+    handler.setFormatter(JsonFormatter() if json_output else TextFormatter())
+    if rate_limit:
+        handler.addFilter(RateLimitFilter())
+
+    logger = logging.getLogger(LOGGER_NAME)
+    logger.setLevel(level)
+    logger.addHandler(handler)
+    return handler
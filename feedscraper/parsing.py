@@ -0,0 +1,184 @@
+"""
+Offline extraction of post fields from captured post HTML, in a pool of worker processes.
+
+Parsing HTML and applying every extractor to it is CPU bound, so a ParsePool ships post HTML in chunks to worker
+processes, which parse it with lxml using the precompiled selectors of the xpaths module and return compact records.
+Records come back in the order the HTML was given, and only a bounded amount of chunks is in flight at a time, so the
+pool can sit behind a live browse generator (see the capture_html parameter of HomeFeed.browse) as well as run over
+archived HTML files (e.g. a profiler corpus).
+
+Only fields that can be read from the HTML itself are extracted: USER, PAGE, TEXT, SPONSORED, RECOMMENDED, LIKED, URL,
+and REACTIONS where the reaction button labels contain counts. TIMESTAMP and COMMENTS need hovering and expanding in
+the browser, so they are left out of the records, as are other fields that were not requested.
+"""
+import os
+import re
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterable, Iterator, List, Optional
+
+from lxml import etree, html
+
+from feedscraper import profiler
+from feedscraper.fields import Field, reactions_from_labels
+
+OFFLINE_FIELDS = [Field.USER, Field.PAGE, Field.TEXT, Field.REACTIONS, Field.SPONSORED, Field.RECOMMENDED,
+                  Field.LIKED, Field.URL]
+"""The fields that can be extracted from post HTML"""
+
+_selectors = None
+
+
+def _xpath(name: str) -> etree.XPath:
+    """Get a selector of the xpaths module by name, compiled once per process"""
+    global _selectors
+    if _selectors is None:
+        _selectors = profiler.compile_selectors()
+    return _selectors[name]
+
+
+def _first(name: str, context) -> Optional[etree._Element]:
+    result = _xpath(name)(context)
+    return result[0] if result else None
+
+
+def _text(element) -> Optional[str]:
+    return None if element is None else element.text_content()
+
+
+def _normalize(fields) -> List[Field]:
+    fields = OFFLINE_FIELDS if fields is None else [Field(field) for field in fields]
+    return [field for field in fields if field in OFFLINE_FIELDS]
+
+
+def parse_post(post_html: str, fields: List[Field] = None) -> dict:
+    """
+    Extract fields from a post's outer HTML, following the same XPaths as the extractors module.
+
+    :param post_html: the outer HTML of a post element
+    :param fields: the fields to extract (Field objects or strings). By default, all of OFFLINE_FIELDS. Other fields
+    are left out.
+    :return: a record of the requested offline fields by name, with values in the format of Post.to_record
+    """
+    return _parse(html.fromstring(post_html), _normalize(fields))
+
+
+def _parse(post, fields: List[Field]) -> dict:
+    record = {}
+    metadata = _first('METADATA', post)
+
+    if metadata is not None and (Field.USER in fields or Field.PAGE in fields or Field.URL in fields):
+        user = page = permalink = None
+        top = _first('ArrowUI.TOP_BY_METADATA', metadata)
+        if top is not None and _first('ArrowUI.ARROW_BY_TOP', top) is not None:
+            user = _text(_first('ArrowUI.USER_BY_TOP', top))
+            page = _text(_first('ArrowUI.PAGE_BY_TOP', top))
+            permalink = _first('ArrowUI.PERMALINK_BY_METADATA', metadata)
+        else:
+            lower = _first('LOWER_METADATA', metadata)
+            if lower is not None and len(lower) == 5:  # posted on group
+                user = _text(_first('NonArrowUI.USER_BY_LOWER_METADATA', lower))
+                page = _text(_first('NonArrowUI.PAGE_BY_METADATA', metadata))
+            else:
+                user = _text(_first('NonArrowUI.PAGE_BY_METADATA', metadata))
+            permalink = _first('NonArrowUI.PERMALINK_BY_METADATA', metadata)
+        if Field.USER in fields:
+            record[Field.USER.value] = user
+        if Field.PAGE in fields:
+            record[Field.PAGE.value] = page
+        if Field.URL in fields:
+            href = None if permalink is None else permalink.get('href')
+            record[Field.URL.value] = None if href is None else re.sub('&.*$', '', href)
+    else:
+        record.update({field.value: None for field in [Field.USER, Field.PAGE, Field.URL] if field in fields})
+
+    if Field.TEXT in fields:
+        record[Field.TEXT.value] = _text(_first('CONTENT_TEXT', post))
+    if Field.SPONSORED in fields:
+        record[Field.SPONSORED.value] = _first('SPONSORED', post) is not None
+    if Field.RECOMMENDED in fields:
+        record[Field.RECOMMENDED.value] = _first('RECOMMENDED', post) is not None
+    if Field.LIKED in fields:
+        like_button = _first('LIKE_BUTTON', post)
+        record[Field.LIKED.value] = None if like_button is None else like_button.get('aria-label') == 'Remove Like'
+    if Field.REACTIONS in fields:
+        bar = _first('REACTIONS_BAR', post)
+        counts = None if bar is None else reactions_from_labels(bar.xpath('.//*/@aria-label'))
+        record[Field.REACTIONS.value] = None if counts is None else dict(counts._asdict())
+    return record
+
+
+def _parse_chunk(chunk: List[str], fields: List[Field]) -> List[dict]:
+    """Runs in the worker processes. Posts that fail to parse or evaluate give None, without failing the chunk."""
+    records = []
+    for post_html in chunk:
+        try:
+            records.append(_parse(html.fromstring(post_html), fields))
+        except (etree.LxmlError, ValueError):  # e.g. ParserError, XPathEvalError
+            records.append(None)
+    return records
+
+
+class ParsePool:
+    """
+    Parses post HTML in a pool of worker processes. Use as a context manager, or close it when done.
+    """
+
+    def __init__(self, fields: List[Field] = None, *, processes: int = None, chunk_size: int = 32,
+                 max_chunks: int = None):
+        """
+        :param fields: the fields to extract (see parse_post)
+        :param processes: the amount of worker processes. By default, the amount of CPUs.
+        :param chunk_size: the amount of posts sent to a worker at once. Larger chunks have less overhead, smaller
+        ones give the first records sooner.
+        :param max_chunks: the maximal amount of chunks in flight. When reached, no more HTML is read from the input
+        until the oldest chunk is parsed. By default, twice the amount of processes.
+        """
+        processes = (os.cpu_count() or 1) if processes is None else processes
+        self.fields = _normalize(fields)
+        self.chunk_size = chunk_size
+        self.max_chunks = 2 * processes if max_chunks is None else max_chunks
+        self.executor = ProcessPoolExecutor(processes)
+
+    def parse(self, htmls: Iterable[str]) -> Iterator[Optional[dict]]:
+        """
+        Parse posts' outer HTML.
+
+        :param htmls: the posts' HTML. Read lazily, so it can be a generator of posts as they are captured.
+        :return: a generator of the posts' records in the order of the input, with None for posts that failed to
+        parse
+        """
+        pending = deque()
+        chunk = []
+        for post_html in htmls:
+            chunk.append(post_html)
+            if len(chunk) == self.chunk_size:
+                pending.append(self.executor.submit(_parse_chunk, chunk, self.fields))
+                chunk = []
+            while len(pending) >= self.max_chunks or (pending and pending[0].done()):
+                yield from pending.popleft().result()
+        if chunk:
+            pending.append(self.executor.submit(_parse_chunk, chunk, self.fields))
+        while pending:
+            yield from pending.popleft().result()
+
+    def parse_files(self, paths: Iterable[str]) -> Iterator[Optional[dict]]:
+        """
+        Parse archived posts, one post's outer HTML per file (see profiler.load_corpus).
+
+        :return: a generator of the posts' records in the order of the files
+        """
+        def read(path):
+            with open(path, encoding='utf-8') as f:
+                return f.read()
+
+        return self.parse(map(read, paths))
+
+    def close(self):
+        self.executor.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
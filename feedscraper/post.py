@@ -1,30 +1,33 @@
 from __future__ import annotations
 
+import logging
 import pprint
 import re
-import traceback
+from collections import namedtuple
 from datetime import datetime
 from enum import Enum
 from time import sleep
 from typing import List
 
-from bs4 import BeautifulSoup
 from selenium.common.exceptions import NoSuchElementException, ElementNotInteractableException, \
-    MoveTargetOutOfBoundsException, TimeoutException
+    MoveTargetOutOfBoundsException, TimeoutException, WebDriverException
 from selenium.webdriver import ActionChains
 from selenium.webdriver.common.by import By
 from selenium.webdriver.remote.webelement import WebElement
 from selenium.webdriver.support import expected_conditions
 from selenium.webdriver.support.wait import WebDriverWait
 
-from feedscraper import extractors
-from feedscraper.extractors import Field, Metadata, Reactions, Reaction
-from feedscraper.utils import warning
+from feedscraper import extractors, log
+from feedscraper.extractors import Field, Metadata, Reactions, Reaction, Comment
+from feedscraper.fields import Census, Tier
+
+logger = log.get_logger(__name__)
 
 
 class Post:
     def __init__(self, feed: Feed, id: int, *, metadata: Metadata, text: str, like_el: WebElement, liked: bool,
-                 sponsored: bool, recommended: bool, reactions: Reactions, url: str):
+                 sponsored: bool, recommended: bool, reactions: Reactions, url: str, comments: List[Comment],
+                 tier: Tier = Tier.FULL):
         self.id = id
         self.feed = feed
         self.metadata = metadata
@@ -35,6 +38,10 @@ class Post:
         self.sponsored = sponsored
         self.recommended = recommended
         self.url = url
+        self.comments = comments
+        self.tier = tier
+        self.html = None
+        """The post element's outer HTML, if captured (see the capture_html parameter of HomeFeed.browse)"""
 
     def by(self, uname_regex: str) -> bool:
         """
@@ -62,6 +69,7 @@ class Post:
 
     def toggle_like(self):
         """Toggle like button by the browsing user."""
+        self._require_like_button()
         action = ActionChains(self.feed.driver)
         try:
             WebDriverWait(self.feed.driver, 5) \
@@ -71,13 +79,21 @@ class Post:
             self.feed.driver.execute_script("arguments[0].click();", self.like_el)
         sleep(0.4)
 
+    def _require_like_button(self):
+        # The button and the like status are extracted together, by the LIKED field
+        if self.like_el is None:
+            raise ValueError('The like button of this post was not extracted. Browse with the LIKED field to like or '
+                             'unlike posts.')
+
     def like(self):
         """Like the post by the browsing user. Posts already liked will not be altered."""
+        self._require_like_button()
         if not self.liked:
             self.toggle_like()
 
     def unlike(self):
         """Unlike posts that were previously liked by the browsing user."""
+        self._require_like_button()
         if self.liked:
             self.toggle_like()
 
@@ -119,114 +135,174 @@ class Post:
             Field.SPONSORED.value: self.sponsored,
             Field.RECOMMENDED.value: self.recommended,
             Field.LIKED.value: self.liked,
-            Field.URL.value: self.url
+            Field.URL.value: self.url,
+            Field.COMMENTS.value: self.comments,
+            'tier': self.tier.value
         }
 
+    def to_record(self):
+        """
+        :return: a dictionary containing post attributes which can be serialized to JSON.
+        Reactions and comments are given as dictionaries, and timestamp as an ISO 8601 string.
+        """
+        record = self.__dict__
+        if self.metadata.timestamp is not None:
+            record[Field.TIMESTAMP.value] = self.metadata.timestamp.isoformat()
+        if self.reactions is not None:
+            record[Field.REACTIONS.value] = dict(self.reactions._asdict())
+        if self.comments is not None:
+            record[Field.COMMENTS.value] = [dict(comment._asdict()) for comment in self.comments]
+        return record
+
     def __str__(self):
         return pprint.pformat(self.__dict__)
 
     @staticmethod
-    def from_home_element(feed: 'HomeFeed', post_element: WebElement, fields: List[str]):
+    def from_census(feed: 'HomeFeed', post_element: WebElement, census: Census):
+        """
+        Create a census-tier Post object, containing only the fields extracted in the post's census.
+
+        :param feed: The Feed object that found the post element
+        :param post_element: the post WebElement.
+        :param census: the post's census (see extractors.census)
+        """
+        return Post(feed, hash(post_element),
+                    metadata=Metadata(census.user, census.page, None), sponsored=census.sponsored,
+                    recommended=census.recommended, text=None, like_el=None, liked=None,
+                    reactions=Reactions(*[None] * len(Reaction)), url=None, comments=None, tier=Tier.CENSUS)
+
+    @staticmethod
+    def from_home_element(feed: 'HomeFeed', post_element: WebElement, fields):
         """
         Parses a post element from the home feed into a Post object.
 
-        This method will also print the time it took to parse each field, so users can decide which
-        are worth their time.
+        This method will also log the time it took to parse each field (at debug level), so users can decide
+        which are worth their time.
 
         :param feed: The Feed object that found the post element
         :param post_element: the post WebElement.
-        :param fields: the fields to scrape. See Field class for the full list. Fields not specified will be set to
-        None.
+        :param fields: the fields to scrape, or an ExtractionPlan compiled from them. See Field class for the full
+        list. Fields not specified will be set to None. When parsing many posts, compile the plan once and pass it.
 
         :return: A Post object containing all the specified fields, parsed from the given WebElement.
         """
-        start = datetime.now()
-
-        # Generally the structure for each field is
-        # ```
-        # if field in fields:
-        #    try:
-        #        field = get_field()
-        #    except NoSuchElementException:
-        #        field = None
-        #    print("Field: " + time_it_took)
-        # else:
-        #    field = None
-        # ```
-
-        # Don't scrape metadata if none of the fields it contains are specified
-        metadata_fields = [Field.USER, Field.PAGE, Field.TIMESTAMP]
-        if set(metadata_fields + [field.value for field in metadata_fields]).intersection(set(fields)):
-            try:
-                metadata = extractors.posting_metadata(post_element, driver=feed.driver, fields=fields)
-            except NoSuchElementException:
-                metadata = Metadata(None, None, None)
-                traceback.format_exc()
-            print('Metadata: ' + str(datetime.now() - start))
-            start = datetime.now()
-        else:
-            metadata = Metadata(None, None, None)
-
-        if Field.SPONSORED.value in fields or Field.SPONSORED in fields:
-            try:
-                sponsored = extractors.is_sponsored(post_element)
-            except NoSuchElementException:
-                sponsored = None
-            print('Sponsored: ' + str(datetime.now() - start))
-            start = datetime.now()
-        else:
-            sponsored = None
-
-        if Field.RECOMMENDED.value in fields or Field.SPONSORED in fields:
-            try:
-                recommended = extractors.is_recommended(post_element)
-            except NoSuchElementException:
-                recommended = None
-            print('Recommended: ' + str(datetime.now() - start))
-            start = datetime.now()
-        else:
-            recommended = None
-
-        if Field.TEXT.value in fields or Field.TEXT in fields:
-            try:
-                text = extractors.text(post_element)
-            except NoSuchElementException:
-                text = None
-            print('Text: ' + str(datetime.now() - start))
-            start = datetime.now()
-        else:
-            text = None
+        plan = fields if isinstance(fields, ExtractionPlan) else ExtractionPlan(fields)
+        return Post(feed, hash(post_element), **plan.execute(feed, post_element))
 
-        try:
-            like_el = extractors.like_el(post_element)
-            liked = extractors.is_liked_by_button(like_el) if Field.LIKED.value in fields else None
-        except NoSuchElementException:
-            like_el = None
-            liked = None
-        print('Like: ' + str(datetime.now() - start))
-        start = datetime.now()
-
-        if Field.REACTIONS.value in fields or Field.REACTIONS in fields:
-            try:
-                reactions = extractors.reactions(post_element, feed.driver)
-            except NoSuchElementException:
-                reactions = Reactions(*[None] * len(Reaction))
-                warning('Failed to grab reactions')
-                warning(traceback.format_exc())
-            print('Reactions: ' + str(datetime.now() - start))
-            start = datetime.now()
-        else:
-            reactions = Reactions(*[None] * len(Reaction))
-
-        if Field.URL.value in fields or Field.URL in fields:
-            try:
-                url = extractors.url(post_element)
-            except NoSuchElementException:
-                url = None
-            print('URL: ' + str(datetime.now() - start))
-        else:
-            url = None
 
-        return Post(feed, hash(post_element),
-                    metadata=metadata, sponsored=sponsored, recommended=recommended, text=text,
-                    like_el=like_el, liked=liked, reactions=reactions, url=url)
+# Generally the structure for each step is
+# ```
+# try:
+#     values['field'] = get_field()
+# except NoSuchElementException:
+#     values['field'] = None
+# ```
+# Values that are not set by any step keep their defaults from ExtractionPlan.execute.
+
+def _extract_metadata(feed, post_element, fields, values):
+    try:
+        values['metadata'] = extractors.posting_metadata(post_element, driver=feed.driver, fields=fields)
+    except NoSuchElementException:
+        logger.debug('Failed to grab metadata', exc_info=True)
+
+
+def _extract_sponsored(feed, post_element, fields, values):
+    try:
+        values['sponsored'] = extractors.is_sponsored(post_element)
+    except NoSuchElementException:
+        pass
+
+
+def _extract_recommended(feed, post_element, fields, values):
+    try:
+        values['recommended'] = extractors.is_recommended(post_element)
+    except NoSuchElementException:
+        pass
+
+
+def _extract_text(feed, post_element, fields, values):
+    try:
+        values['text'] = extractors.text(post_element)
+    except NoSuchElementException:
+        pass
+
+
+def _extract_like(feed, post_element, fields, values):
+    try:
+        values['like_el'] = extractors.like_el(post_element)
+        values['liked'] = extractors.is_liked_by_button(values['like_el'])
+    except NoSuchElementException:
+        pass
+
+
+def _extract_reactions(feed, post_element, fields, values):
+    try:
+        values['reactions'] = extractors.reactions(post_element, feed.driver)
+    except NoSuchElementException:
+        logger.warning('Failed to grab reactions', exc_info=logger.isEnabledFor(logging.DEBUG))
+
+
+def _extract_url(feed, post_element, fields, values):
+    try:
+        values['url'] = extractors.url(post_element)
+    except NoSuchElementException:
+        pass
+
+
+def _extract_comments(feed, post_element, fields, values):
+    try:
+        values['comments'] = extractors.comments(post_element, feed.driver,
+                                                 depth=feed.COMMENT_DEPTH, limit=feed.COMMENT_LIMIT)
+    except (WebDriverException, NoSuchElementException):
+        logger.warning('Failed to grab comments', exc_info=logger.isEnabledFor(logging.DEBUG))
+
+
+Step = namedtuple('Step', ['name', 'fields', 'extract'])
+"""A namedtuple class that contains an extraction step's name, the fields it extracts and its function"""
+
+_STEPS = [
+    # The metadata section is found once for all the fields it contains
+    Step('Metadata', frozenset([Field.USER, Field.PAGE, Field.TIMESTAMP]), _extract_metadata),
+    Step('Sponsored', frozenset([Field.SPONSORED]), _extract_sponsored),
+    Step('Recommended', frozenset([Field.RECOMMENDED]), _extract_recommended),
+    Step('Text', frozenset([Field.TEXT]), _extract_text),
+    Step('Like', frozenset([Field.LIKED]), _extract_like),
+    Step('Reactions', frozenset([Field.REACTIONS]), _extract_reactions),
+    Step('URL', frozenset([Field.URL]), _extract_url),
+    Step('Comments', frozenset([Field.COMMENTS]), _extract_comments),
+]
+"""All the extraction steps, in the order they are executed"""
+
+
+class ExtractionPlan:
+    """
+    The extraction steps needed for a set of fields, compiled once (e.g. for a browse call) and executed on each post.
+    Only the steps extracting requested fields are included, so no work is done for fields that were not requested.
+    """
+
+    def __init__(self, fields=None):
+        """
+        :param fields: the fields to extract (Field objects or strings). By default, all of them.
+        """
+        self.fields = frozenset(Field) if fields is None else frozenset(Field(field) for field in fields)
+        self.steps = [step for step in _STEPS if step.fields & self.fields]
+
+    def __contains__(self, field) -> bool:
+        return Field(field) in self.fields
+
+    def execute(self, feed: 'HomeFeed', post_element: WebElement) -> dict:
+        """
+        Run the plan's steps on a post element.
+
+        :return: the extracted values by Post constructor parameter. Values of fields that were not extracted are None.
+        """
+        values = {
+            'metadata': Metadata(None, None, None), 'sponsored': None, 'recommended': None, 'text': None,
+            'like_el': None, 'liked': None, 'reactions': Reactions(*[None] * len(Reaction)), 'url': None,
+            'comments': None
+        }
+        for step in self.steps:
+            start = datetime.now()
+            step.extract(feed, post_element, self.fields, values)
+            logger.debug('%s: %s', step.name, datetime.now() - start)
+        return values
@@ -0,0 +1,283 @@
+"""
+Profiling of the XPath queries in the xpaths module against a corpus of saved post HTML.
+
+Each selector in xpaths, xpaths.ArrowUI and xpaths.NonArrowUI is precompiled and timed against every post in the
+corpus, offline with lxml and optionally in the browser, giving its average cost and hit rate (the fraction of posts
+it matched in). Selectors named X_BY_Y are evaluated relative to the elements matched by selector Y, as they are used
+by the extractors; others are evaluated relative to the post element.
+
+Reports can be saved and compared against a baseline, to flag selectors that got slower or stopped matching after
+they were changed, or after facebook changed its UI.
+
+Run with `python -m feedscraper.profiler CORPUS_DIR [--browser] [--save REPORT] [--baseline REPORT]`, where the
+corpus directory contains one post's outer HTML per .html file (e.g. saved from post.get_attribute('outerHTML')).
+"""
+import argparse
+import glob
+import json
+import os
+from collections import namedtuple
+from pathlib import Path
+from time import perf_counter
+from typing import Dict, List
+
+from lxml import etree, html
+
+from feedscraper import xpaths
+
+Selector = namedtuple('Selector', ['name', 'xpath', 'context'])
+"""
+A namedtuple class that contains a selector's name (e.g "ArrowUI.USER_BY_TOP"), its XPath, and the name of the
+selector it is relative to (None if relative to the post)
+"""
+Stats = namedtuple('Stats', ['xpath', 'mean_ms', 'hit_rate', 'error'])
+"""A namedtuple class that contains a selector's XPath, average evaluation time, hit rate and compilation error"""
+
+_NAMESPACES = [('', xpaths), ('ArrowUI.', xpaths.ArrowUI), ('NonArrowUI.', xpaths.NonArrowUI)]
+
+
+def _context_name(prefix: str, name: str, names: List[str]) -> str:
+    """Find the selector a X_BY_Y selector is relative to: Y (or Y_BY_...) in the same class, or at module level"""
+    context = name.split('_BY_', 1)[1]
+    for candidate_prefix in dict.fromkeys([prefix, '']):
+        for candidate in names:
+            local = candidate[len(candidate_prefix):] if candidate.startswith(candidate_prefix) else ''
+            if '.' not in local and local.split('_BY_')[0] == context:
+                return candidate
+    raise ValueError(f'No selector found for the context of {prefix}{name}')
+
+
+def selectors() -> List[Selector]:
+    """
+    :return: all the selectors in the xpaths module, ordered so each selector comes after its context.
+    """
+    found = {}
+    for prefix, namespace in _NAMESPACES:
+        for name, value in vars(namespace).items():
+            # IS_ constants are predicates to put inside queries rather than queries
+            if name.isupper() and isinstance(value, str) and not name.startswith('IS_'):
+                found[prefix + name] = (prefix, name, value)
+
+    names = list(found)
+    ordered = {}
+
+    def add(full_name):
+        if full_name in ordered:
+            return
+        prefix, name, xpath = found[full_name]
+        context = _context_name(prefix, name, names) if '_BY_' in name else None
+        if context is not None:
+            add(context)
+        ordered[full_name] = Selector(full_name, xpath, context)
+
+    for full_name in names:
+        add(full_name)
+    return list(ordered.values())
+
+
+def compile_selectors() -> Dict[str, etree.XPath]:
+    """
+    Precompile the selectors in the xpaths module for offline evaluation with lxml.
+
+    :return: a dictionary of compiled XPath objects by selector name. Selectors lxml fails to compile are left out.
+    """
+    compiled = {}
+    for selector in selectors():
+        try:
+            compiled[selector.name] = etree.XPath(selector.xpath)
+        except etree.XPathSyntaxError:
+            pass
+    return compiled
+
+
+def load_corpus(directory: str) -> List[str]:
+    """:return: the paths of the post HTML files in a corpus directory"""
+    return sorted(glob.glob(os.path.join(directory, '*.html')))
+
+
+def profile_lxml(corpus: List[str], repeat: int = 10) -> Dict[str, Stats]:
+    """
+    Time the selectors against a corpus with lxml.
+
+    :param corpus: paths of post HTML files
+    :param repeat: the amount of times each selector is evaluated on each post
+    :return: the statistics of each selector by name
+    """
+    all_selectors = selectors()
+    compiled, errors = {}, {}
+    for selector in all_selectors:
+        try:
+            compiled[selector.name] = etree.XPath(selector.xpath)
+        except etree.XPathSyntaxError as e:
+            errors[selector.name] = str(e)
+
+    times = {selector.name: 0.0 for selector in all_selectors}
+    hits = {selector.name: 0 for selector in all_selectors}
+    for path in corpus:
+        with open(path, encoding='utf-8') as f:
+            post = html.fromstring(f.read())
+        matches = {}  # Selector name -> matched elements, used as the context of dependant selectors
+        for selector in all_selectors:
+            if selector.name in errors:
+                continue
+            contexts = [post] if selector.context is None else matches.get(selector.context, [])
+            xpath = compiled[selector.name]
+            result = []
+            start = perf_counter()
+            for _ in range(repeat):
+                result = [node for context in contexts for node in _as_list(xpath(context))]
+            times[selector.name] += (perf_counter() - start) * 1000 / repeat
+            matches[selector.name] = [node for node in result if isinstance(node, etree._Element)]
+            hits[selector.name] += bool(result)
+
+    return _stats(all_selectors, times, hits, errors, len(corpus))
+
+
+def _as_list(result) -> list:
+    # Non-node expressions give a boolean, number or string, which count as a match when true
+    return result if isinstance(result, list) else [result] if result else []
+
+
+_PROFILE_SCRIPT = '''
+var selectors = arguments[0], repeat = arguments[1];
+var post = document.body.firstElementChild;
+var matches = {}, stats = {};
+selectors.forEach(function (selector) {
+    var contexts = selector.context === null ? [post] : (matches[selector.context] || []);
+    var nodes = [], error = null;
+    var start = performance.now();
+    try {
+        for (var i = 0; i < repeat; i++) {
+            nodes = [];
+            contexts.forEach(function (context) {
+                var result = document.evaluate(selector.xpath, context, null, XPathResult.ORDERED_NODE_SNAPSHOT_TYPE,
+                                               null);
+                for (var j = 0; j < result.snapshotLength; j++) { nodes.push(result.snapshotItem(j)); }
+            });
+        }
+    } catch (e) { error = String(e); }
+    stats[selector.name] = {ms: (performance.now() - start) / repeat, hit: nodes.length > 0, error: error};
+    matches[selector.name] = nodes;
+});
+return stats;
+'''
+"""Times each selector against the post in the current page, resolving contexts as profile_lxml does"""
+
+
+def profile_browser(driver, corpus: List[str], repeat: int = 10) -> Dict[str, Stats]:
+    """
+    Time the selectors against a corpus in the browser. Timing is done inside the page, so it does not include
+    webdriver round trips.
+
+    :param driver: a webdriver to load the posts in
+    :param corpus: paths of post HTML files
+    :param repeat: the amount of times each selector is evaluated on each post
+    :return: the statistics of each selector by name
+    """
+    all_selectors = selectors()
+    arguments = [dict(selector._asdict()) for selector in all_selectors]
+    times = {selector.name: 0.0 for selector in all_selectors}
+    hits = {selector.name: 0 for selector in all_selectors}
+    errors = {}
+    for path in corpus:
+        driver.get(Path(path).absolute().as_uri())
+        for name, result in driver.execute_script(_PROFILE_SCRIPT, arguments, repeat).items():
+            times[name] += result['ms']
+            hits[name] += result['hit']
+            if result['error'] is not None:
+                errors[name] = result['error']
+    return _stats(all_selectors, times, hits, errors, len(corpus))
+
+
+def _stats(all_selectors, times, hits, errors, count) -> Dict[str, Stats]:
+    """Average per-post times (in milliseconds) and hits over the corpus"""
+    count = max(count, 1)
+    return {
+        selector.name: Stats(selector.xpath, None if selector.name in errors else times[selector.name] / count,
+                             hits[selector.name] / count, errors.get(selector.name))
+        for selector in all_selectors
+    }
+
+
+def save_report(report: Dict[str, Stats], path: str):
+    with open(path, 'w') as f:
+        json.dump({name: stats._asdict() for name, stats in report.items()}, f, indent=2)
+
+
+def load_report(path: str) -> Dict[str, Stats]:
+    with open(path) as f:
+        return {name: Stats(**stats) for name, stats in json.load(f).items()}
+
+
+def regressions(report: Dict[str, Stats], baseline: Dict[str, Stats], *, slowdown: float = 1.5,
+                hit_rate_drop: float = 0.1) -> List[str]:
+    """
+    Compare a report against a baseline report.
+
+    :param slowdown: flag selectors whose average time grew by more than this factor
+    :param hit_rate_drop: flag selectors whose hit rate dropped by more than this
+    :return: descriptions of the regressions found
+    """
+    found = []
+    for name, stats in report.items():
+        old = baseline.get(name)
+        if old is None:
+            continue
+        if stats.error is not None and old.error is None:
+            found.append(f'{name}: no longer compiles ({stats.error})')
+            continue
+        changed = ' (selector changed)' if stats.xpath != old.xpath else ''
+        if stats.mean_ms is not None and old.mean_ms and stats.mean_ms > old.mean_ms * slowdown:
+            found.append(f'{name}: {old.mean_ms:.3f}ms -> {stats.mean_ms:.3f}ms{changed}')
+        if old.hit_rate - stats.hit_rate > hit_rate_drop:
+            found.append(f'{name}: hit rate {old.hit_rate:.0%} -> {stats.hit_rate:.0%}{changed}')
+    return found
+
+
+def format_report(report: Dict[str, Stats]) -> str:
+    """:return: a table of the selectors in a report, most expensive first"""
+    lines = [f'{"Selector":<40} {"Mean (ms)":>10} {"Hit rate":>9}']
+    for name, stats in sorted(report.items(), key=lambda item: -(item[1].mean_ms or 0)):
+        cost = 'error' if stats.error is not None else f'{stats.mean_ms:.3f}'
+        lines.append(f'{name:<40} {cost:>10} {stats.hit_rate:>9.0%}')
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m feedscraper.profiler',
+                                     description='Profile the XPath selectors against a corpus of saved posts.')
+    parser.add_argument('corpus', help='a directory of post HTML files')
+    parser.add_argument('--browser', action='store_true', help='also profile in a chrome browser')
+    parser.add_argument('--repeat', type=int, default=10, help='evaluations of each selector per post')
+    parser.add_argument('--save', help='save the lxml report to this file')
+    parser.add_argument('--baseline', help='compare the lxml report against this saved report')
+    args = parser.parse_args(argv)
+
+    corpus = load_corpus(args.corpus)
+    report = profile_lxml(corpus, args.repeat)
+    print('lxml:')
+    print(format_report(report))
+
+    if args.browser:
+        from selenium import webdriver
+        from webdriver_manager.chrome import ChromeDriverManager
+        driver = webdriver.Chrome(ChromeDriverManager().install())
+        try:
+            print('\nBrowser:')
+            print(format_report(profile_browser(driver, corpus, args.repeat)))
+        finally:
+            driver.quit()
+
+    if args.save is not None:
+        save_report(report, args.save)
+    if args.baseline is not None:
+        found = regressions(report, load_report(args.baseline))
+        print('\nRegressions:' if found else '\nNo regressions.')
+        for regression in found:
+            print(regression)
+        return 1 if found else 0
+    return 0
+
+
+if __name__ == '__main__':
+    exit(main())
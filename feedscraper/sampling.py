@@ -0,0 +1,54 @@
+"""
+Sampling of posts for full extraction. When browsing with a sampler, every post is counted in a cheap census, and
+only the posts chosen by the sampler are fully extracted (see Tier).
+"""
+import hashlib
+from typing import Dict
+
+from feedscraper.fields import Census
+
+SPONSORED = 'sponsored'
+RECOMMENDED = 'recommended'
+ORGANIC = 'organic'
+
+
+def stratum(census: Census) -> str:
+    """
+    :return: the stratum of a post by its census: SPONSORED, RECOMMENDED or ORGANIC
+    """
+    if census.sponsored:
+        return SPONSORED
+    if census.recommended:
+        return RECOMMENDED
+    return ORGANIC
+
+
+class Sampler:
+    """
+    Chooses posts for full extraction, at a fixed rate or at a rate for each stratum. The choice is a deterministic
+    function of the post's key (see extractors.post_key) and the sampler's seed, so a post seen again, e.g in another
+    session or by another persona, gets the same choice.
+    """
+
+    def __init__(self, rate: float = None, *, rates: Dict[str, float] = None, seed: str = ''):
+        """
+        :param rate: the fraction of posts to choose
+        :param rates: the fraction of posts to choose in each stratum (SPONSORED, RECOMMENDED and ORGANIC). Strata not
+        given are sampled at `rate`, or not at all if it is not given.
+        :param seed: changes the choice of posts between samplers with the same rates
+        """
+        if rate is None and rates is None:
+            raise ValueError('Either a rate or rates by stratum should be given')
+        self.rate = 0 if rate is None else rate
+        self.rates = {} if rates is None else rates
+        self.seed = seed
+
+    def select(self, key: str, census: Census) -> bool:
+        """
+        :param key: the post's key
+        :param census: the post's census
+        :return: whether the post should be fully extracted
+        """
+        rate = self.rates.get(stratum(census), self.rate)
+        digest = hashlib.sha1(f'{self.seed}:{key}'.encode()).digest()
+        return int.from_bytes(digest[:8], 'big') / 2 ** 64 < rate
@@ -0,0 +1,134 @@
+"""
+Management of the logged-in facebook session of a persona.
+
+Cookies may be persisted to a file and restored in later sessions, so a persona whose session is still valid goes
+straight to the feed with a single page load, and only logs in again once the session expired.
+"""
+import json
+import os
+
+from selenium.common.exceptions import NoSuchElementException, TimeoutException
+from selenium.webdriver.chrome.webdriver import WebDriver
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support.wait import WebDriverWait
+
+FACEBOOK_URL = 'https://www.facebook.com'
+
+_LOGIN_STATE_SCRIPT = '''
+if (document.querySelector('#email, #pass, [name="login"]') !== null) { return false; }
+if (document.querySelector('[aria-label="Home"], [role="feed"]') !== null) { return true; }
+return null;
+'''
+"""
+Checks for the logged-in state: false if a login form is displayed, true if facebook's navigation or a feed are
+displayed, and null if the page did not render either yet.
+"""
+
+
+def _cdp_cookie(cookie: dict) -> dict:
+    """Convert a cookie as given by webdriver's get_cookies to the devtools protocol's format"""
+    converted = {key: cookie[key] for key in ['name', 'value', 'domain', 'path', 'secure', 'httpOnly', 'sameSite']
+                 if key in cookie}
+    if 'expiry' in cookie:
+        converted['expires'] = cookie['expiry']
+    return converted
+
+
+class Session:
+    """
+    A facebook session in a webdriver, optionally persisted to a cookie file.
+    """
+    LOGIN_TIMEOUT = 15
+    """Time (in seconds) to wait for facebook to finish logging in after the login form is sent"""
+    STATE_TIMEOUT = 5
+    """Time (in seconds) to wait for a loaded page to render enough to tell whether the user is logged in"""
+
+    def __init__(self, driver: WebDriver, cookie_file: str = None):
+        """
+        :param driver: the webdriver to manage the session of
+        :param cookie_file: a JSON file to persist the session cookies in. If not specified, cookies are kept only in
+        the browser profile.
+        """
+        self.driver = driver
+        self.cookie_file = cookie_file
+
+    def is_logged_in(self, timeout: float = None) -> bool:
+        """
+        Check whether the current page is displayed to a logged-in user. This is a single script call, repeated only
+        while the page has not rendered yet.
+
+        :param timeout: time (in seconds) to wait for the page to render. Session.STATE_TIMEOUT by default.
+        """
+        timeout = Session.STATE_TIMEOUT if timeout is None else timeout
+        try:
+            return WebDriverWait(self.driver, timeout, poll_frequency=0.1).until(lambda _: self._login_state())[0]
+        except TimeoutException:
+            return False
+
+    def _login_state(self):
+        # Wrapped in a tuple, so a logged-out (False) state still ends a WebDriverWait
+        state = self.driver.execute_script(_LOGIN_STATE_SCRIPT)
+        return None if state is None else (state,)
+
+    def save_cookies(self):
+        """Write the browser's current facebook cookies to the cookie file, if one is set."""
+        if self.cookie_file is None:
+            return
+        tmp_path = self.cookie_file + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(self.driver.get_cookies(), f)
+        os.replace(tmp_path, self.cookie_file)
+
+    def restore_cookies(self) -> bool:
+        """
+        Load the cookies in the cookie file into the browser. This is done through the devtools protocol, so unlike
+        webdriver's add_cookie it needs no facebook page to be loaded first.
+
+        :return: whether any cookies were restored
+        """
+        if self.cookie_file is None or not os.path.exists(self.cookie_file):
+            return False
+        profile_cookies = self.driver.execute_cdp_cmd('Network.getCookies', {'urls': [FACEBOOK_URL]})['cookies']
+        if any(cookie['name'] == 'c_user' for cookie in profile_cookies):  # The browser profile already has a session
+            return False
+
+        with open(self.cookie_file) as f:
+            cookies = json.load(f)
+        self.driver.execute_cdp_cmd('Network.setCookies', {'cookies': [_cdp_cookie(cookie) for cookie in cookies]})
+        return bool(cookies)
+
+    def login(self, email: str, password: str) -> bool:
+        """
+        Log in through facebook's login form, which should be displayed in the current page.
+
+        :return: whether the login succeeded
+        """
+        try:
+            self.driver.find_element(By.ID, 'email').send_keys(email)
+            self.driver.find_element(By.ID, 'pass').send_keys(password)
+            self.driver.find_element(By.NAME, 'login').click()  # Send mouse click
+        except NoSuchElementException:
+            return False
+
+        try:
+            WebDriverWait(self.driver, Session.LOGIN_TIMEOUT).until(
+                lambda driver: driver.execute_script(_LOGIN_STATE_SCRIPT))
+        except TimeoutException:
+            return False
+        self.save_cookies()
+        return True
+
+    def start(self, email: str, password: str) -> bool:
+        """
+        Open facebook as the given user, reusing the saved session if it is still valid and logging in otherwise.
+
+        :param email: the email of the user to log in to
+        :param password: the password of the user to log in to
+        :return: whether the browser is now logged in
+        """
+        self.restore_cookies()
+        self.driver.get(FACEBOOK_URL)
+        if self.is_logged_in():
+            self.save_cookies()  # Facebook rotates some cookies during a session
+            return True
+        return self.login(email, password)
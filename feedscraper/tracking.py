@@ -0,0 +1,210 @@
+"""
+Tracking of the reaction counts of known posts over time.
+
+A ReactionTracker keeps the URLs of posts (e.g. collected while browsing) in an SQLite file, and revisits them on a
+schedule which checks young and fast-growing posts more often than old and stable ones. Only the reactions are
+extracted on each visit, from the labels of the reaction buttons where possible, and only changes in the counts are
+stored.
+"""
+import json
+import sqlite3
+from datetime import datetime, timedelta
+from time import time
+from typing import Iterable, List, Optional, Tuple
+
+from selenium.common.exceptions import TimeoutException, WebDriverException
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support import expected_conditions
+from selenium.webdriver.support.wait import WebDriverWait
+
+from feedscraper import extractors, xpaths, log
+from feedscraper.fields import Reactions
+
+logger = log.get_logger(__name__)
+
+_REACTION_NAMES = list(Reactions._fields)
+
+
+class ReactionTracker:
+    """
+    Revisits known posts by their URLs on a schedule, recording changes in their reaction counts.
+    """
+    MIN_INTERVAL = timedelta(minutes=15)
+    """The shortest time between checks of a post"""
+    MAX_INTERVAL = timedelta(days=2)
+    """The longest time between checks of a post"""
+    AGE_FACTOR = 0.25
+    """Posts are checked after this fraction of their age (since first seen) has passed since the last check"""
+    GROWTH_FACTOR = 10
+    """Posts gaining this many reactions per hour are checked twice as often, and so on"""
+    LOAD_TIMEOUT = 10
+    """Time (in seconds) to wait for a post page to load"""
+    MAX_FAILURES = 5
+    """Posts that fail to load this many times in a row (e.g. deleted posts) are no longer checked"""
+
+    def __init__(self, feed: 'Feed', path: str):
+        """
+        :param feed: the feed whose browser should be used to visit posts. Its page is navigated away from the feed.
+        :param path: the tracker's database file. Created if it does not exist.
+        """
+        self.feed = feed
+        self.db = sqlite3.connect(path)
+        self.db.executescript('''
+            CREATE TABLE IF NOT EXISTS posts (
+                url TEXT PRIMARY KEY,
+                first_seen REAL NOT NULL,
+                last_checked REAL,
+                next_check REAL NOT NULL,
+                counts TEXT,
+                growth REAL NOT NULL DEFAULT 0,
+                failures INTEGER NOT NULL DEFAULT 0
+            );
+            CREATE INDEX IF NOT EXISTS posts_by_next_check ON posts(next_check);
+            CREATE TABLE IF NOT EXISTS changes (
+                url TEXT NOT NULL REFERENCES posts(url),
+                time REAL NOT NULL,
+                deltas TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS changes_by_url ON changes(url, time);
+        ''')
+        columns = [row[1] for row in self.db.execute('PRAGMA table_info(posts)')]
+        if 'failures' not in columns:  # Created by an older version
+            with self.db:
+                self.db.execute('ALTER TABLE posts ADD COLUMN failures INTEGER NOT NULL DEFAULT 0')
+
+    def add(self, urls: Iterable[str], seen: datetime = None):
+        """
+        Start tracking posts. Posts already tracked are ignored.
+
+        :param urls: the posts' URLs (see Field.URL)
+        :param seen: when the posts were first seen, now by default. Used to estimate their age.
+        """
+        seen = time() if seen is None else seen.timestamp()
+        with self.db:
+            self.db.executemany('INSERT OR IGNORE INTO posts (url, first_seen, next_check) VALUES (?, ?, ?)',
+                                [(url, seen, seen) for url in urls if url is not None])
+
+    def due(self, limit: int = None) -> List[str]:
+        """
+        :param limit: maximal amount of URLs to return
+        :return: URLs of the posts due for a check, most overdue first. Posts that failed to load MAX_FAILURES times
+        in a row are left out.
+        """
+        return [row[0] for row in self.db.execute(
+            'SELECT url FROM posts WHERE next_check <= ? AND failures < ? ORDER BY next_check LIMIT ?',
+            (time(), ReactionTracker.MAX_FAILURES, -1 if limit is None else limit)
+        )]
+
+    def _interval(self, age: float, growth: float) -> float:
+        """Time (in seconds) until the next check of a post of the given age (seconds) and growth (per hour)"""
+        # Shrinking posts (removed reactions, or rounding of approximate counts) are scheduled as stable ones
+        interval = ReactionTracker.AGE_FACTOR * age / (1 + max(growth, 0) / ReactionTracker.GROWTH_FACTOR)
+        return min(max(interval, ReactionTracker.MIN_INTERVAL.total_seconds()),
+                   ReactionTracker.MAX_INTERVAL.total_seconds())
+
+    def visit(self, url: str) -> Optional[Reactions]:
+        """
+        Open a post and get its reaction counts, from the reaction button labels if they contain counts, and by
+        hovering over the buttons otherwise.
+
+        :return: the post's reactions, or None if the post or its reactions could not be loaded
+        """
+        driver = self.feed.driver
+        try:
+            driver.get(url)
+            post = WebDriverWait(driver, ReactionTracker.LOAD_TIMEOUT) \
+                .until(expected_conditions.presence_of_element_located((By.XPATH, xpaths.PERMALINK_POST)))
+            # Reading the counts before the reaction bar is rendered would give zeros
+            WebDriverWait(driver, ReactionTracker.LOAD_TIMEOUT) \
+                .until(lambda _: post.find_elements(By.XPATH, xpaths.REACTIONS_BAR))
+            counts = extractors.reaction_counts(post, driver)
+            if counts is None:
+                counts = extractors.reactions(post, driver)
+            return counts
+        except (TimeoutException, WebDriverException):
+            logger.warning('Failed to load %s', url)
+            return None
+
+    def record(self, url: str, counts: Reactions, checked: float = None):
+        """
+        Record reaction counts of a post, storing the change from its previous counts and scheduling its next check.
+
+        :param url: the post's URL
+        :param counts: the post's current reaction counts
+        :param checked: the time (UNIX timestamp) the counts were taken, now by default
+        """
+        checked = time() if checked is None else checked
+        first_seen, last_checked, previous, growth = self.db.execute(
+            'SELECT first_seen, last_checked, counts, growth FROM posts WHERE url = ?', (url,)
+        ).fetchone()
+        previous = [0] * len(_REACTION_NAMES) if previous is None else json.loads(previous)
+        current = [previous_count if count is None else count for count, previous_count in zip(counts, previous)]
+
+        deltas = {name: count - previous_count
+                  for name, count, previous_count in zip(_REACTION_NAMES, current, previous) if count != previous_count}
+        if last_checked is not None:
+            hours = max(checked - last_checked, 1) / 3600
+            growth = sum(deltas.values()) / hours
+
+        with self.db:
+            if deltas:
+                self.db.execute('INSERT INTO changes (url, time, deltas) VALUES (?, ?, ?)',
+                                (url, checked, json.dumps(deltas, separators=(',', ':'))))
+            self.db.execute(
+                'UPDATE posts SET last_checked = ?, next_check = ?, counts = ?, growth = ?, failures = 0 WHERE url = ?',
+                (checked, checked + self._interval(checked - first_seen, growth), json.dumps(current), growth, url)
+            )
+
+    def record_failure(self, url: str, checked: float = None):
+        """
+        Record a failed check of a post, rescheduling it with exponential backoff without losing its schedule. After
+        MAX_FAILURES failures in a row, the post is no longer checked.
+
+        :param url: the post's URL
+        :param checked: the time (UNIX timestamp) of the check, now by default
+        """
+        checked = time() if checked is None else checked
+        failures, = self.db.execute('SELECT failures FROM posts WHERE url = ?', (url,)).fetchone()
+        failures += 1
+        if failures >= ReactionTracker.MAX_FAILURES:
+            logger.warning('Failed to load %s %d times in a row, no longer tracking it', url, failures)
+        delay = min(ReactionTracker.MIN_INTERVAL.total_seconds() * 2 ** (failures - 1),
+                    ReactionTracker.MAX_INTERVAL.total_seconds())
+        with self.db:
+            self.db.execute('UPDATE posts SET next_check = ?, failures = ? WHERE url = ?',
+                            (checked + delay, failures, url))
+
+    def run(self, *, max_posts: int = None, max_seconds: float = None) -> int:
+        """
+        Check the posts that are due, most overdue first.
+
+        :param max_posts: maximal amount of posts to check
+        :param max_seconds: stop after checking posts for this amount of seconds
+        :return: the amount of posts checked
+        """
+        start = time()
+        checked = 0
+        for url in self.due(max_posts):
+            if max_seconds is not None and time() - start >= max_seconds:
+                break
+            counts = self.visit(url)
+            if counts is None:
+                self.record_failure(url)
+                continue
+            self.record(url, counts)
+            checked += 1
+        return checked
+
+    def series(self, url: str) -> List[Tuple[datetime, Reactions]]:
+        """
+        Get the reaction counts of a post over time, rebuilt from the stored changes.
+
+        :return: a list of (time, reactions) tuples, one for each time the counts were found to change
+        """
+        counts = dict.fromkeys(_REACTION_NAMES, 0)
+        result = []
+        for checked, deltas in self.db.execute('SELECT time, deltas FROM changes WHERE url = ? ORDER BY time', (url,)):
+            for name, delta in json.loads(deltas).items():
+                counts[name] += delta
+            result.append((datetime.fromtimestamp(checked), Reactions(**counts)))
+        return result
@@ -1,16 +1,8 @@
-import re
-import traceback
 from enum import Enum
-from time import sleep
+from typing import TYPE_CHECKING
 
-from bs4 import BeautifulSoup
-from selenium.common.exceptions import NoSuchElementException, ElementNotInteractableException, \
-    StaleElementReferenceException
-from selenium.webdriver.common.by import By
-from selenium.webdriver.remote.webelement import WebElement
-from selenium.webdriver.support import expected_conditions
-from selenium.webdriver.support.wait import WebDriverWait
-from termcolor import colored
+if TYPE_CHECKING:
+    from selenium.webdriver.remote.webelement import WebElement
 
 
 class Color(Enum):
@@ -20,6 +12,7 @@ class Color(Enum):
 
 
 def colortext(text: str, color: Color, marker=False):
+    from termcolor import colored
     if marker:
         return colored(text, on_color=color.value)
     return colored(text, color.value)
@@ -37,6 +30,6 @@ def warning(text: str):
     print(colortext(text, Color.YELLOW))
 
 
-def print_element(el: WebElement):
+def print_element(el: 'WebElement'):
+    from bs4 import BeautifulSoup
     return BeautifulSoup(el.get_attribute('outerHTML'), features='lxml').prettify()
-
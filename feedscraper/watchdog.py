@@ -0,0 +1,74 @@
+"""
+Monitoring of the browser's resource use over long browsing sessions.
+
+The page's memory and DOM size grow steadily as the infinite feed is scrolled, until the page slows down or the
+renderer crashes. A Watchdog passed to HomeFeed.browse samples them periodically, and when they cross its thresholds
+(or the browser crashed) the browser is restarted with the same profile and browsing resumes, skipping posts that were
+already generated.
+"""
+from collections import namedtuple
+
+from selenium.common.exceptions import WebDriverException
+from selenium.webdriver.chrome.webdriver import WebDriver
+
+from feedscraper import log
+
+logger = log.get_logger(__name__)
+
+Sample = namedtuple('Sample', ['heap', 'nodes'])
+"""A namedtuple class that contains the page's used JS heap size (in bytes) and its amount of DOM nodes"""
+
+
+class Watchdog:
+    """
+    Decides when the browser of a feed should be recycled, based on samples of its memory use and DOM size.
+    """
+
+    def __init__(self, *, max_heap_mb: float = 1024, max_nodes: int = 200000, interval: int = 25):
+        """
+        :param max_heap_mb: the used JS heap size (in megabytes) above which the browser is recycled
+        :param max_nodes: the amount of DOM nodes above which the browser is recycled
+        :param interval: the amount of posts generated between samples
+        """
+        self.max_heap = max_heap_mb * 1024 * 1024
+        self.max_nodes = max_nodes
+        self.interval = interval
+        self.restarts = 0
+        self._enabled_session = None  # Session ID of the driver the performance domain was enabled in
+
+    def sample(self, driver: WebDriver) -> Sample:
+        """
+        Sample the memory use and DOM size of the driver's current page through the Chrome DevTools protocol.
+        """
+        if self._enabled_session != driver.session_id:
+            driver.execute_cdp_cmd('Performance.enable', {})
+            self._enabled_session = driver.session_id
+        metrics = {metric['name']: metric['value']
+                   for metric in driver.execute_cdp_cmd('Performance.getMetrics', {})['metrics']}
+        return Sample(metrics.get('JSHeapUsedSize', 0), metrics.get('Nodes', 0))
+
+    def should_recycle(self, driver: WebDriver, post_count: int) -> bool:
+        """
+        Check whether the browser should be recycled. The browser is sampled once every `interval` posts.
+
+        :param driver: the feed's webdriver
+        :param post_count: the amount of posts generated so far
+        """
+        if post_count % self.interval != 0:
+            return False
+
+        sample = self.sample(driver)
+        logger.debug('Browser heap: %.1fMB, DOM nodes: %d', sample.heap / 1024 / 1024, sample.nodes)
+        if sample.heap > self.max_heap or sample.nodes > self.max_nodes:
+            logger.info('Recycling browser (heap: %.1fMB, DOM nodes: %d)', sample.heap / 1024 / 1024, sample.nodes)
+            return True
+        return False
+
+    @staticmethod
+    def is_crashed(driver: WebDriver) -> bool:
+        """Check whether the browser or its page crashed, and no longer responds to scripts"""
+        try:
+            driver.execute_script('return 1;')
+            return False
+        except WebDriverException:
+            return True
@@ -0,0 +1,208 @@
+"""
+A worker running persona scraping jobs from a job queue (see the jobs module).
+
+Run with `python -m feedscraper.worker`:
+- `work --queue URL` leases jobs from the queue and runs them until stopped (or, with --once, runs a single job).
+- `broker --queue sqlite:///PATH` serves an SQLite queue over TCP, for workers on other machines.
+- `submit --queue URL JOB_FILE` adds the jobs in a JSON file (a list of job objects) to the queue.
+
+Workers heartbeat their jobs' leases while running, and ship results in batches. If checkpoints are kept in a
+directory shared by the workers, a job interrupted by a worker restart resumes from its checkpoint, so posts
+already shipped are not collected again. Checkpoints are only saved once a batch was accepted by the queue, so posts
+that were collected but not shipped are collected again.
+"""
+import argparse
+import json
+import logging
+import os
+import socket
+import threading
+from time import monotonic, sleep
+
+from feedscraper import log
+from feedscraper.checkpoint import Checkpoint
+from feedscraper.jobs import Job, JobQueue, Broker, SQLiteQueue, open_queue
+
+logger = log.get_logger(__name__)
+
+
+class Worker:
+    """
+    Leases jobs from a queue and runs each as a HomeFeed browsing session.
+    """
+    POLL_INTERVAL = 10
+    """Time (in seconds) to wait before asking for a job again when the queue has none available"""
+
+    def __init__(self, queue: JobQueue, worker_id: str = None, *, lease_seconds: float = 60, batch_size: int = 20,
+                 checkpoint_dir: str = None):
+        """
+        :param queue: the queue to lease jobs from
+        :param worker_id: a unique ID of the worker. A restarted worker with the same ID picks up its previous job.
+        By default, the host name and process ID.
+        :param lease_seconds: the duration of job leases. Leases are extended every third of it.
+        :param batch_size: the amount of posts shipped to the queue at once
+        :param checkpoint_dir: a directory to keep job checkpoints in (see HomeFeed.browse)
+        """
+        self.queue = queue
+        self.id = f'{socket.gethostname()}-{os.getpid()}' if worker_id is None else worker_id
+        self.lease_seconds = lease_seconds
+        self.batch_size = batch_size
+        self.checkpoint_dir = checkpoint_dir
+
+    def run(self, once: bool = False):
+        """
+        Run jobs from the queue.
+
+        :param once: return after running a single job, or if no job is available
+        """
+        while True:
+            job = self.queue.lease(self.id, self.lease_seconds)
+            if job is not None:
+                self.run_job(job)
+            elif once:
+                return
+            else:
+                sleep(Worker.POLL_INTERVAL)
+
+            if once:
+                return
+
+    def _heartbeat(self, job: Job, stop: threading.Event, lost: threading.Event):
+        """
+        Extend the job's lease until stopped, setting `lost` if the lease was taken by another worker, or could not be
+        extended before it expired.
+        """
+        renewed = monotonic()
+        while not stop.wait(self.lease_seconds / 3):
+            try:
+                if not self.queue.heartbeat(job.id, self.id, self.lease_seconds):
+                    lost.set()
+                    return
+                renewed = monotonic()
+            except Exception:  # Any queue error, e.g. a locked database or a dropped broker connection
+                logger.warning('Failed to send heartbeat for %r', job, exc_info=logger.isEnabledFor(logging.DEBUG))
+                if monotonic() - renewed >= self.lease_seconds:
+                    logger.warning('The lease of %r expired without being renewed', job)
+                    lost.set()
+                    return
+
+    def _ship(self, job: Job, batch: list, checkpoint: Checkpoint) -> bool:
+        """
+        Submit a batch of results, saving the checkpoint once they were accepted.
+
+        :return: whether the results were accepted
+        """
+        if not self.queue.submit_results(job.id, self.id, batch):
+            return False
+        checkpoint.post_count += len(batch)
+        checkpoint.save()
+        return True
+
+    def run_job(self, job: Job) -> bool:
+        """
+        Run a leased job, shipping its results to the queue.
+
+        :return: whether the job was completed
+        """
+        from feedscraper.feed import HomeFeed  # The browser stack is only needed when running jobs
+
+        logger.info('Running %r', job)
+        stop, lost = threading.Event(), threading.Event()
+        heartbeat = threading.Thread(target=self._heartbeat, args=(job, stop, lost), daemon=True)
+        heartbeat.start()
+
+        # In memory if there is no checkpoint directory, so shipping below works the same
+        checkpoint = Checkpoint(None)
+        if self.checkpoint_dir is not None:
+            checkpoint = Checkpoint.load(os.path.join(self.checkpoint_dir, f'job_{job.id}.json'))
+
+        feed = None
+        posts = None
+        batch = []
+        try:
+            if job.max_posts is not None and checkpoint.post_count >= job.max_posts:  # Done before it was interrupted
+                return self.queue.complete(job.id, self.id)
+            feed = HomeFeed(job.email, job.password, data_dir=job.data_dir, cookie_file=job.cookie_file)
+            # The checkpoint is only saved here, after each batch is shipped. The browse generator is suspended while
+            # a batch is shipped, so the posts it has marked as seen are exactly the posts shipped so far.
+            posts = feed.browse(fields=job.fields, checkpoint=checkpoint)
+            start = monotonic()
+            for post in posts:
+                batch.append(post.to_record())
+                if len(batch) >= self.batch_size:
+                    if not self._ship(job, batch, checkpoint):
+                        lost.set()
+                    batch = []
+                if lost.is_set():
+                    logger.warning('Lost the lease of %r, abandoning it', job)
+                    return False
+                # Posts shipped before the job was resumed count too
+                if job.max_posts is not None and checkpoint.post_count + len(batch) >= job.max_posts:
+                    break
+                if job.max_seconds is not None and monotonic() - start >= job.max_seconds:
+                    break
+
+            if batch and not self._ship(job, batch, checkpoint):
+                return False
+            return self.queue.complete(job.id, self.id)
+        except (Exception, SystemExit) as e:  # The browser stack exits when it can't find the feed
+            logger.error('%r failed: %r', job, e, exc_info=logger.isEnabledFor(logging.DEBUG))
+            try:
+                self.queue.fail(job.id, self.id, repr(e))
+            except Exception:  # The job is failed once its lease expires (see JobQueue.lease)
+                logger.warning('Failed to report the failure of %r', job, exc_info=logger.isEnabledFor(logging.DEBUG))
+            return False
+        finally:
+            stop.set()
+            if posts is not None:
+                posts.close()
+            posts = feed = None  # Quits the browser (see Feed.__del__)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m feedscraper.worker', description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--log-level', default='INFO', help='the level of log messages to output')
+    parser.add_argument('--json-logs', action='store_true', help='output log messages as JSON lines')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    work = commands.add_parser('work', help='run jobs from a queue')
+    work.add_argument('--queue', required=True, help='sqlite:///PATH or tcp://HOST:PORT')
+    work.add_argument('--id', help='a unique ID of the worker')
+    work.add_argument('--lease', type=float, default=60, help='the duration of job leases, in seconds')
+    work.add_argument('--batch-size', type=int, default=20, help='the amount of posts shipped at once')
+    work.add_argument('--checkpoint-dir', help='a directory to keep job checkpoints in')
+    work.add_argument('--once', action='store_true', help='run a single job and exit')
+
+    broker = commands.add_parser('broker', help='serve an SQLite queue over TCP')
+    broker.add_argument('--queue', required=True, help='sqlite:///PATH')
+    broker.add_argument('--host', default='localhost', help='the address to listen on')
+    broker.add_argument('--port', type=int, default=7340, help='the port to listen on')
+
+    submit = commands.add_parser('submit', help='add jobs to a queue')
+    submit.add_argument('--queue', required=True, help='sqlite:///PATH or tcp://HOST:PORT')
+    submit.add_argument('job_file', help='a JSON file containing a list of jobs')
+
+    args = parser.parse_args(argv)
+    log.configure(args.log_level.upper(), json_output=args.json_logs)
+
+    if args.command == 'work':
+        if args.checkpoint_dir is not None:
+            os.makedirs(args.checkpoint_dir, exist_ok=True)
+        Worker(open_queue(args.queue), args.id, lease_seconds=args.lease, batch_size=args.batch_size,
+               checkpoint_dir=args.checkpoint_dir).run(once=args.once)
+    elif args.command == 'broker':
+        queue = open_queue(args.queue)
+        if not isinstance(queue, SQLiteQueue):
+            parser.error('the broker serves SQLite queues only')
+        with Broker(queue, args.host, args.port) as server:
+            logger.info('Serving %s on %s:%d', args.queue, args.host, args.port)
+            server.serve_forever()
+    elif args.command == 'submit':
+        queue = open_queue(args.queue)
+        with open(args.job_file) as f:
+            for job in json.load(f):
+                print(queue.put(Job.from_dict(job)))
+
+
+if __name__ == '__main__':
+    main()
@@ -97,6 +97,8 @@ SECOND_POST = '//*[' + equals(Attr.DATA_PAGELET, 'FeedUnit_1') + ']'
 """XPath query for the second post in a home feed"""
 NTH_POST = '//*[' + equals(Attr.DATA_PAGELET, 'FeedUnit_{n}') + ']'
 """XPath query for the posts in a facebook home feed, from the third onwards"""
+FEED_UNITS = f'{FEED}//*[{starts_with(Attr.DATA_PAGELET, "FeedUnit_")}]'
+"""XPath query for all the posts loaded in a facebook home feed"""
 
 # Consistency #2:
 # The top section of the post, which contains metadata such as time, user and page, is always in a div element of
@@ -127,16 +129,30 @@ CONTENT_TEXT = f'{METADATA}/../../../../div[3]'
 TOOLTIP = f'//*[{IS_TOOLTIP}]'
 """XPath query for popup tooltips"""
 
+PERMALINK_POST = f'(//*[{equals(Attr.ROLE, "main")}]//div[{equals(Attr.ROLE, "article")}])[1]'
+"""XPath query for the post element in a post's permalink page"""
+
 # Helper strings to generate more comments query, because RegEx caused issues.
 _more_comments = [f'contains(text(), "View {i} more comments")' for i in range(1, 10)]
 _more_comments.append('contains(text(), "View more comments")')
 
 MORE_COMMENTS = f'.//div[{IS_BUTTON}]//*[{" or ".join(_more_comments)}]'
 """XPath query for more comments button in a post"""
+MORE_REPLIES = f'.//div[{IS_BUTTON}]//span[{contains(Attr.TEXT, " repl")} or {contains(Attr.TEXT, " Repl")}]'
+"""XPath query for buttons expanding the replies to a comment (e.g "View 2 replies", "1 Reply")"""
+
+COMMENT = f'.//div[{equals(Attr.ROLE, "article")} and ' \
+          f'({starts_with(Attr.ARIA_LABEL, "Comment by")} or {starts_with(Attr.ARIA_LABEL, "Reply by")})]'
+"""XPath query for comments and replies in a post"""
 
 REACTIONS_BAR = f'.//span[{equals(Attr.ARIA_LABEL, "See who reacted to this")} and {equals(Attr.ROLE, "toolbar")}]'
 """XPath query for the element containing reaction buttons in a post"""
 
+SIDEBAR = f'//*[{equals(Attr.ROLE, "complementary")}]'
+"""XPath query for the right-hand sidebar of the home page, where sponsored ads are displayed"""
+SIDEBAR_AD_TEXT = f'//a[{equals(Attr.ARIA_LABEL, "Advertiser")} and @rel="nofollow noopener"]/div/div/div/span'
+"""XPath query for the text of sidebar ads, with the advertiser name on the first line and the link on the second"""
+
 
 class ArrowUI:
     """
@@ -1,10 +1,12 @@
 import configparser
+import logging
 import subprocess
 from configparser import ConfigParser
 from time import sleep
 from typing import Tuple
 
-from feedscraper import utils
+from feedscraper import utils, log
+from feedscraper.ads import AdTracker
 from feedscraper.extractors import Field
 from feedscraper.feed import HomeFeed
 from feedscraper.post import Post
@@ -21,7 +23,7 @@ def get_login(name: str) -> Tuple[str, str]:
 
 def like_posts(feed):
     utils.confirm('We will now go on liking posts posted by users that start with E.')
-    for i, post in enumerate(feed.browse(fields=[Field.USER])):
+    for i, post in enumerate(feed.browse(fields=[Field.USER, Field.LIKED])):
         print(f'--- {i:02d} ---')
         print(post)
         if post.by('^[Ee]'):
@@ -33,14 +35,12 @@ def like_posts(feed):
 
 
 def show_side_ads(feed):
-    ads = feed.get_sidebar_ads()
-    print(ads)
+    tracker = AdTracker(feed)
     while True:
         feed.scroll_to_bottom()
         sleep(2.5)
-        if feed.get_sidebar_ads()[0] != ads[0]:
-            ads = feed.get_sidebar_ads()
-            print(ads)
+        for impression in tracker.drain():
+            print(impression)
 
 
 def collect_posts(feed):
@@ -71,6 +71,7 @@ def pick_and_run(feed):
 
 
 if __name__ == '__main__':
+    log.configure(logging.DEBUG)
     user = 'Example A'
     email, password = get_login(user)
     feed = HomeFeed(email, password, data_dir=f'data/{user.replace(" ", "_")}')
@@ -0,0 +1,38 @@
+"""
+Import-time budget of the offline parts of the package, which are imported by short-lived worker processes.
+"""
+import json
+import os
+import subprocess
+import sys
+
+IMPORT_BUDGET = 0.5
+"""Maximal time (in seconds) to import the offline modules"""
+
+BROWSER_STACK = ['selenium', 'bs4', 'termcolor', 'webdriver_manager']
+
+_IMPORT_SCRIPT = '''
+import json, sys
+from time import perf_counter
+start = perf_counter()
+import feedscraper, feedscraper.fields, feedscraper.jobs
+print(json.dumps({'seconds': perf_counter() - start, 'modules': sorted(sys.modules)}))
+'''
+
+
+def _import_offline_modules() -> dict:
+    # A fresh interpreter, so modules imported by other tests don't count
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    output = subprocess.run([sys.executable, '-c', _IMPORT_SCRIPT], cwd=root, check=True, capture_output=True,
+                            text=True).stdout
+    return json.loads(output)
+
+
+def test_no_browser_stack_on_import():
+    modules = _import_offline_modules()['modules']
+    loaded = [module for module in modules if module.split('.')[0] in BROWSER_STACK]
+    assert loaded == []
+
+
+def test_import_time_budget():
+    assert _import_offline_modules()['seconds'] < IMPORT_BUDGET
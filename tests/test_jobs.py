@@ -0,0 +1,111 @@
+"""
+Leasing guarantees of the job queues, on a temporary SQLite file and through a broker.
+"""
+import threading
+
+import pytest
+
+from feedscraper.jobs import Broker, BrokerClient, Job, SQLiteQueue
+
+EXPIRED = -1
+"""A lease duration (in seconds) that has already expired"""
+
+
+@pytest.fixture
+def queue(tmp_path) -> SQLiteQueue:
+    return SQLiteQueue(str(tmp_path / 'queue.db'))
+
+
+def _job(persona: str, **kwargs) -> Job:
+    return Job(persona, f'{persona}@example.com', 'password', **kwargs)
+
+
+def test_persona_leased_to_one_worker(queue):
+    first = queue.put(_job('alice'))
+    second = queue.put(_job('alice'))
+    other = queue.put(_job('bob'))
+
+    assert queue.lease('worker-1', 60).id == first
+    # The second job of alice waits until the first is done
+    assert queue.lease('worker-2', 60).id == other
+    assert queue.lease('worker-3', 60) is None
+
+    assert queue.complete(first, 'worker-1')
+    assert queue.lease('worker-3', 60).id == second
+
+
+def test_expired_lease_is_leased_again(queue):
+    job_id = queue.put(_job('alice'))
+    assert queue.lease('worker-1', EXPIRED).id == job_id
+
+    assert queue.lease('worker-2', 60).id == job_id
+    # The dead worker lost the job
+    assert not queue.heartbeat(job_id, 'worker-1', 60)
+    assert queue.heartbeat(job_id, 'worker-2', 60)
+
+
+def test_worker_reclaims_its_job(queue):
+    job_id = queue.put(_job('alice', max_posts=10))
+    assert queue.lease('worker-1', 60).id == job_id
+
+    job = queue.lease('worker-1', 60)
+    assert job.id == job_id
+    assert job.max_posts == 10
+    assert queue.lease('worker-2', 60) is None
+
+
+def test_failed_after_max_attempts(queue):
+    job_id = queue.put(_job('alice'))
+    for attempt in range(queue.MAX_ATTEMPTS):
+        assert queue.lease('worker-1', 60).id == job_id
+        assert queue.fail(job_id, 'worker-1', f'error {attempt}')
+
+    assert queue.lease('worker-1', 60) is None
+    assert not queue.fail(job_id, 'worker-1', 'error')
+
+
+def test_expired_lease_failed_after_max_attempts(queue):
+    job_id = queue.put(_job('alice'))
+    for _ in range(queue.MAX_ATTEMPTS):
+        assert queue.lease('worker-1', EXPIRED).id == job_id
+
+    other = queue.put(_job('alice'))
+    # The persona is released along with the failed job
+    assert queue.lease('worker-2', 60).id == other
+
+
+def test_results_rejected_after_lease_lost(queue):
+    job_id = queue.put(_job('alice'))
+    queue.lease('worker-1', EXPIRED)
+    assert queue.submit_results(job_id, 'worker-1', [{'text': 'first'}])
+
+    queue.lease('worker-2', 60)
+    assert not queue.submit_results(job_id, 'worker-1', [{'text': 'late'}])
+    assert not queue.complete(job_id, 'worker-1')
+    assert queue.submit_results(job_id, 'worker-2', [{'text': 'second'}])
+    assert queue.results(job_id) == [{'text': 'first'}, {'text': 'second'}]
+
+
+def test_broker_round_trip(queue):
+    server = Broker(queue, 'localhost', 0)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        client = BrokerClient('localhost', server.server_address[1], timeout=5)
+        job_id = client.put(_job('alice', fields=['USER', 'TEXT']))
+
+        job = client.lease('worker-1', 60)
+        assert job.id == job_id
+        assert job.persona == 'alice'
+        assert job.fields == ['USER', 'TEXT']
+        assert client.lease('worker-2', 60) is None
+
+        assert client.heartbeat(job_id, 'worker-1', 60)
+        assert client.submit_results(job_id, 'worker-1', [{'text': 'post'}])
+        assert client.complete(job_id, 'worker-1')
+        assert client.results(job_id) == [{'text': 'post'}]
+        with pytest.raises(RuntimeError):
+            client._call('close')
+    finally:
+        server.shutdown()
+        server.server_close()